@@ -60,15 +60,19 @@ class TSP_SC:
         ## Pause to actually see something
         plt.pause(0.00001)
 
-    ## Cost of the current configuration, computed from scratch
+    ## Cost of the current configuration, computed from scratch.
+    ## `np.roll(route, -1)` is the route shifted by one position (the first city
+    ## goes to the end), so `route[e]` and `np.roll(route, -1)[e]` are the two
+    ## endpoints of edge `e`: all the edges are looked up at once in the matrix.
     def cost(self):
-        n, route, dist = self.n, self.route, self.dist
-        c = 0.0
-        for e in range(n):
-            city1 = route[e]
-            city2 = route[(e+1) % n]
-            c += dist[city1, city2]
-        return c
+        route, dist = self.route, self.dist
+        return dist[route, np.roll(route, -1)].sum()
+
+    ## The costs of many routes at once, given as a 2-d array with one route per
+    ## row (e.g. to rank many candidate tours). The configuration is not used.
+    def costs(self, routes):
+        routes = np.asarray(routes)
+        return self.dist[routes, np.roll(routes, -1, axis=1)].sum(axis=1)
 
     ## Propose a valid random move. We want to propose the "swap two random
     ## cities" type of move. We will encode a move with just two indices, in
@@ -63,15 +63,19 @@ class TSP_Base:
         ## Pause to actually see something
         plt.pause(0.00001)
 
-    ## Cost of the current configuration, computed from scratch
+    ## Cost of the current configuration, computed from scratch.
+    ## `np.roll(route, -1)` is the route shifted by one position (the first city
+    ## goes to the end), so `route[e]` and `np.roll(route, -1)[e]` are the two
+    ## endpoints of edge `e`: all the edges are looked up at once in the matrix.
     def cost(self):
-        n, route, dist = self.n, self.route, self.dist
-        c = 0.0
-        for e in range(n):
-            city1 = route[e]
-            city2 = route[(e+1) % n]
-            c += dist[city1, city2]
-        return c
+        route, dist = self.route, self.dist
+        return dist[route, np.roll(route, -1)].sum()
+
+    ## The costs of many routes at once, given as a 2-d array with one route per
+    ## row (e.g. to rank many candidate tours). The configuration is not used.
+    def costs(self, routes):
+        routes = np.asarray(routes)
+        return self.dist[routes, np.roll(routes, -1, axis=1)].sum(axis=1)
 
     ## Make an entirely independent duplicate of the current object.
     def copy(self):
@@ -212,3 +216,101 @@ class TSP_SC(TSP_Base):
         ## Cost difference
         delta_c = c_new - c_old
         return delta_c
+
+
+## Mixed-moves version: besides the cross-links moves (a.k.a. "2-opt") of
+## `TSP_CL`, it can also propose two other kinds of moves, which help to get
+## out of the local minima of the 2-opt:
+##   * "Or-opt": take a piece of 1 to 3 consecutive cities and move it
+##     somewhere else in the route (possibly reversing it). It's encoded as
+##     `("oropt", i, L, j, rev)`: the cities at positions i,...,i+L-1 are moved
+##     between the cities at positions j and j+1 (and reversed if `rev`).
+##   * "3-opt" (in its simplest form, the "segment swap"): cut the route in
+##     three places and exchange two consecutive pieces, without reversing
+##     them. It's encoded as `("3opt", i, j, k)` with i < j < k: the pieces
+##     i+1,...,j and j+1,...,k are exchanged.
+## The 2-opt moves are still encoded as `(e1, e2)`, as in `TSP_CL`.
+## In all cases only 2 or 3 links change, so the delta cost is computed in
+## O(1) time from the distances. The kind of move is chosen at random with the
+## given `move_weights` (for 2-opt, Or-opt and 3-opt, in this order; they are
+## normalized automatically). All the proposals are still symmetric.
+class TSP_MX(TSP_CL):
+    def __init__(self, n, seed = None, move_weights = (1.0, 1.0, 1.0)):
+        move_weights = np.array(move_weights, dtype=float)
+        if move_weights.shape != (3,) or (move_weights < 0).any() or move_weights.sum() == 0:
+            raise Exception("move_weights must be 3 non-negative numbers, not all zero")
+        ## Cumulative probabilities, for choosing the kind of move
+        self.move_cumprob = np.cumsum(move_weights) / move_weights.sum()
+        super().__init__(n, seed)
+
+    def propose_move(self):
+        u = np.random.rand()
+        if u < self.move_cumprob[0]:
+            return super().propose_move()
+        elif u < self.move_cumprob[1]:
+            return self.propose_oropt()
+        else:
+            return self.propose_3opt()
+
+    def propose_oropt(self):
+        n = self.n
+        ## With too few cities there would be no place where to move the piece
+        L = np.random.randint(min(3, n-3)) + 1
+        i = np.random.randint(n - L + 1) # the piece doesn't wrap around the end
+        while True:
+            j = np.random.randint(n)
+            ## j must not be inside the piece or just before it
+            if j != (i - 1) % n and not (i <= j < i + L):
+                break
+        rev = np.random.rand() < 0.5
+        return ("oropt", i, L, j, rev)
+
+    def propose_3opt(self):
+        n = self.n
+        i, j, k = np.sort(np.random.choice(n, 3, replace=False))
+        return ("3opt", i, j, k)
+
+    def accept_move(self, move):
+        route = self.route
+        if move[0] == "oropt":
+            _, i, L, j, rev = move
+            piece = route[i:i+L]
+            if rev:
+                piece = piece[::-1]
+            ## Remove the piece, then insert it after the city that was at
+            ## position j (which shifts back by L if it was after the piece)
+            rest = np.concatenate((route[:i], route[i+L:]))
+            ja = j if j < i else j - L
+            route[:] = np.concatenate((rest[:ja+1], piece, rest[ja+1:]))
+        elif move[0] == "3opt":
+            _, i, j, k = move
+            route[i+1:k+1] = np.concatenate((route[j+1:k+1], route[i+1:j+1]))
+        else:
+            super().accept_move(move)
+
+    def compute_delta_cost(self, move):
+        n, route, dist = self.n, self.route, self.dist
+        if move[0] == "oropt":
+            _, i, L, j, rev = move
+            ## The piece goes from `first` to `last`, between `p` and `nx`;
+            ## it will go between `a` and `b`
+            p, first = route[(i-1) % n], route[i]
+            last, nx = route[i+L-1], route[(i+L) % n]
+            a, b = route[j], route[(j+1) % n]
+            c_old = dist[p, first] + dist[last, nx] + dist[a, b]
+            if rev:
+                first, last = last, first
+            c_new = dist[p, nx] + dist[a, first] + dist[last, b]
+        elif move[0] == "3opt":
+            _, i, j, k = move
+            ## The links (i,i+1), (j,j+1), (k,k+1) become (i,j+1), (k,i+1), (j,k+1)
+            ci, ci1 = route[i], route[i+1]
+            cj, cj1 = route[j], route[j+1]
+            ck, ck1 = route[k], route[(k+1) % n]
+            c_old = dist[ci, ci1] + dist[cj, cj1] + dist[ck, ck1]
+            c_new = dist[ci, cj1] + dist[ck, ci1] + dist[cj, ck1]
+        else:
+            return super().compute_delta_cost(move)
+        ## Cost difference
+        delta_c = c_new - c_old
+        return delta_c
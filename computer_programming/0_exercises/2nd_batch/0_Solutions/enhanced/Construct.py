@@ -0,0 +1,113 @@
+import numpy as np
+
+import Spatial
+
+### CONSTRUCTIVE INITIAL TOURS ###
+
+## A random permutation is a terrible tour (about sqrt(n)/2 times longer
+## than the optimal one for uniform random cities in the unit square), and
+## the first stages of the annealing are spent just undoing it. These
+## "construction heuristics" build reasonable tours quickly (typically
+## 15-25% above the optimum), so the annealing can start from a lower
+## temperature. They all take the coordinates of the cities and return a
+## route (a permutation of the cities).
+
+## Nearest neighbour: start from a city and always go to the nearest city not
+## visited yet. The nearest city is looked for among the `k` nearest neighbours
+## first, and only if they have all been visited in the grid of the remaining
+## cities (see `GridIndex` in "Spatial.py").
+def nearest_neighbour_tour(x, y, start = 0, k = 10):
+    n = len(x)
+    neigh = Spatial.knn(x, y, min(k, n-1)).tolist()
+    grid = Spatial.GridIndex(x, y)
+    visited = [False] * n
+    route = np.zeros(n, dtype=int)
+    c = start
+    for t in range(n):
+        route[t] = c
+        visited[c] = True
+        grid.remove(c)
+        if t == n-1:
+            break
+        for d in neigh[c]:
+            if not visited[d]:
+                break
+        else:
+            d = grid.nearest(c)
+        c = d
+    return route
+
+## Greedy edge matching: go through the edges from the shortest to the longest
+## and take each one unless it would give a city more than two edges or close
+## a cycle (too early). Only the edges between `k` nearest neighbours are
+## considered; the pieces of tour obtained at the end are then joined
+## together, going each time from the end of a piece to the nearest endpoint
+## of another piece.
+## To check if an edge would close a cycle we use a "union-find" structure:
+## each city points to another one in the same piece, and following the
+## pointers we get to a representative of the piece.
+def greedy_edge_tour(x, y, k = 10):
+    n = len(x)
+    neigh, ndist = Spatial.knn(x, y, min(k, n-1), return_dist=True)
+    ## All the candidate edges (each one appears twice, it doesn't matter)
+    order = np.argsort(ndist, axis=None, kind="stable")
+    edges_i = np.repeat(np.arange(n), neigh.shape[1])[order].tolist()
+    edges_j = neigh.ravel()[order].tolist()
+
+    parent = list(range(n))
+    def find(c):
+        while parent[c] != c:
+            parent[c] = parent[parent[c]] # shortcut the path (makes it faster)
+            c = parent[c]
+        return c
+
+    adj = [[] for c in range(n)]
+    for i, j in zip(edges_i, edges_j):
+        if len(adj[i]) < 2 and len(adj[j]) < 2:
+            ri, rj = find(i), find(j)
+            if ri != rj:
+                parent[ri] = rj
+                adj[i].append(j)
+                adj[j].append(i)
+
+    ## The endpoints of the pieces (a city alone is a piece with both
+    ## endpoints equal to it); for each endpoint, the other end of its piece
+    other_end = {}
+    for c in range(n):
+        if len(adj[c]) < 2 and c not in other_end:
+            prev, cur = -1, c
+            while True:
+                nxt = [d for d in adj[cur] if d != prev]
+                if not nxt:
+                    break
+                prev, cur = cur, nxt[0]
+            other_end[c], other_end[cur] = cur, c
+
+    ## Join the pieces, and finally close the tour
+    ends = Spatial.GridIndex(x, y, list(other_end))
+    c0 = c = next(iter(other_end))
+    while True:
+        e = other_end[c]
+        ends.remove(c)
+        ends.remove(e)
+        d = ends.nearest(e) if len(ends) > 0 else c0
+        adj[e].append(d)
+        adj[d].append(e)
+        if d == c0:
+            break
+        c = d
+
+    ## Walk along the tour
+    route = np.zeros(n, dtype=int)
+    prev, cur = -1, 0
+    for t in range(n):
+        route[t] = cur
+        nxt = adj[cur][0] if adj[cur][0] != prev else adj[cur][-1]
+        prev, cur = cur, nxt
+    return route
+
+## Space-filling curve: just visit the cities in the order of a Hilbert curve
+## (see `hilbert_order` in "Spatial.py"). Very fast, but the tours are worse
+## (typically 25-40% above the optimum).
+def hilbert_tour(x, y):
+    return Spatial.hilbert_order(x, y)
@@ -0,0 +1,151 @@
+import numpy as np
+
+### EXACT SOLUTION OF SUDOKU AND LATIN SQUARES (ALGORITHM X) ###
+
+## The annealing can't tell us that a puzzle has no solution (it just doesn't
+## find one), nor whether the solution is unique, and it struggles with the
+## hardest puzzles. Here we solve them exactly, as "exact cover" problems, with
+## Knuth's Algorithm X.
+##
+## An exact cover problem has a set of "constraints" (the columns) and a set of
+## "choices" (the rows), each of which satisfies some of the constraints; we
+## must pick a set of choices such that each constraint is satisfied by exactly
+## one of them. For a latin square, the choice (i,j,v) means "put value v in
+## entry (i,j)", and it satisfies four constraints:
+##  * ("cell", i, j): entry (i,j) has a value;
+##  * ("row", i, v): row i contains v;
+##  * ("col", j, v): column j contains v;
+##  * ("box", b, v): sub-square b contains v (only for Sudoku).
+## The fixed entries of a puzzle are choices that are made at the start.
+##
+## Algorithm X is a depth-first search: take the constraint satisfied by the
+## fewest choices (if it's zero, backtrack), try each of those choices in turn,
+## and when trying one remove all the constraints that it satisfies and all the
+## other choices that conflict with it (those which satisfy one of the same
+## constraints). Knuth's "dancing links" implements the removals with doubly
+## linked lists; here instead, as in the well-known version by Ali Assaf, we
+## use a dict of sets: `X[c]` is the set of the choices which satisfy
+## constraint `c`, and `Y[r]` the list of the constraints of choice `r`.
+## `select` removes a choice (and everything it conflicts with) from `X`, and
+## returns what it removed so that `deselect` can put it back.
+##
+## The search is a generator, so we can take the first solution, count them up
+## to a limit (e.g. 2, to check that a puzzle has a unique solution), or go
+## through all of them.
+
+## Choose `r`: remove its constraints from X, and the conflicting choices from
+## the other constraints. Returns the removed constraints, in order.
+def select(X, Y, r):
+    removed = []
+    for c in Y[r]:
+        for r1 in X[c]:
+            for c1 in Y[r1]:
+                if c1 != c:
+                    X[c1].remove(r1)
+        removed.append(X.pop(c))
+    return removed
+
+## Undo `select(X, Y, r)` (the removals must be undone in reverse order)
+def deselect(X, Y, r, removed):
+    for c in reversed(Y[r]):
+        X[c] = removed.pop()
+        for r1 in X[c]:
+            for c1 in Y[r1]:
+                if c1 != c:
+                    X[c1].add(r1)
+
+## Generate all the exact covers: yields lists of choices (the ones in
+## `partial`, followed by the ones found by the search)
+def algorithm_x(X, Y, partial):
+    if not X:
+        yield list(partial)
+        return
+    c = min(X, key=lambda c: len(X[c]))
+    for r in list(X[c]):
+        partial.append(r)
+        removed = select(X, Y, r)
+        yield from algorithm_x(X, Y, partial)
+        deselect(X, Y, r, removed)
+        partial.pop()
+
+## The exact cover problem of a puzzle `init` (a table with -1 in the free
+## entries, as for `Sudoku`), with the sub-square constraints if `boxes` is
+## True (Sudoku) or without them (latin square).
+## Returns X and Y, and the choices of the fixed entries (or None if the fixed
+## entries already conflict with each other).
+def exact_cover(init, boxes = True):
+    init = np.asarray(init)
+    n = init.shape[0]
+    sn = int(np.sqrt(n))
+    if init.ndim != 2 or init.shape[1] != n:
+        raise Exception("the init array must be square")
+    if boxes and sn * sn != n:
+        raise Exception("the init size must be an exact square")
+    if ((init < -1) | (init >= n)).any():
+        raise Exception("the entries of the puzzle must be between -1 and n-1")
+
+    Y = {}
+    for i in range(n):
+        for j in range(n):
+            for v in range(n):
+                Y[i,j,v] = [("cell", i, j), ("row", i, v), ("col", j, v)]
+                if boxes:
+                    Y[i,j,v].append(("box", (i // sn) * sn + j // sn, v))
+    X = {}
+    for r, cs in Y.items():
+        for c in cs:
+            X.setdefault(c, set()).add(r)
+
+    fixed = []
+    for i, j in zip(*np.nonzero(init >= 0)):
+        r = (int(i), int(j), int(init[i,j]))
+        ## If one of its constraints was removed, the choice conflicts with
+        ## a previous fixed entry
+        if any(c not in X for c in Y[r]):
+            return X, Y, None
+        select(X, Y, r)
+        fixed.append(r)
+    return X, Y, fixed
+
+## Generate all the solutions of the puzzle `init`, as tables
+def solutions(init, boxes = True):
+    X, Y, fixed = exact_cover(init, boxes)
+    if fixed is None:
+        return
+    n = len(init)
+    for choices in algorithm_x(X, Y, fixed):
+        table = np.zeros((n,n), dtype=int)
+        for i, j, v in choices:
+            table[i,j] = v
+        yield table
+
+## The first solution of the puzzle `init`, or None if it has no solution
+def solve_table(init, boxes = True):
+    return next(solutions(init, boxes), None)
+
+## The number of solutions of the puzzle `init`, counting up to `limit` (with
+## the default value 2, this checks whether the solution is unique)
+def count(init, limit = 2, boxes = True):
+    num = 0
+    for table in solutions(init, boxes):
+        num += 1
+        if num >= limit:
+            break
+    return num
+
+## Solve a problem instance exactly: returns a copy of `probl` (a `Sudoku` or a
+## `LatinSquare`) with a solution, so it can be used like the result of `simann`.
+## For a `Sudoku`, the fixed entries are those in its `mask`; a `LatinSquare`
+## has none.
+def solve(probl):
+    n = probl.n
+    if hasattr(probl, "mask"):
+        init = np.where(probl.mask, probl.table, -1)
+    else:
+        init = np.full((n,n), -1)
+    table = solve_table(init, boxes=hasattr(probl, "sn"))
+    if table is None:
+        raise Exception("the puzzle has no solution")
+    best = probl.copy()
+    best.restore(table)
+    return best
@@ -0,0 +1,118 @@
+import numpy as np
+import time
+
+import RandBuffer as RB
+import Telemetry
+from SimAnn import MoveSource
+
+## This file is the same as "../Greedy.py", copied here so that it can be used
+## together with the solvers of this directory. The only change is that
+## `display` is really optional now (it's called only if the problem has it),
+## and the seeding goes through "RandBuffer.py". Also, like `simann`, it can
+## evaluate the moves in batches (see `MoveSource` in "SimAnn.py"), and it
+## has the same `verbose` and `telemetry` options (see "Telemetry.py"); with
+## `telemetry=True` it returns `(best, stats)`, where `stats` is a dict with the
+## record array "runs" (one row per repeat).
+## Finally, there are two more modes besides the random one, for the problems
+## which can enumerate their moves (see the `mode` option below).
+
+## Looks for an improving move in the whole neighbourhood of the current
+## configuration. Returns the move and its delta cost, or None if there isn't
+## any (i.e. we are at a local optimum).
+##  * mode="steepest": evaluates all the moves (with a single call to
+##    `compute_delta_cost_batch`) and returns the best one
+##  * mode="first": evaluates the moves in blocks, starting from a random
+##    block, and returns the first improving one
+def find_move(probl, mode):
+    moves = probl.all_moves()
+    if mode == "steepest":
+        deltas = probl.compute_delta_cost_batch(moves)
+        i = np.argmin(deltas)
+        return (moves[i], deltas[i]) if deltas[i] < 0 else None
+    ## About sqrt(N) blocks of sqrt(N) moves each
+    nblocks = max(1, int(np.sqrt(len(moves))))
+    blocks = np.array_split(moves, nblocks)
+    start = RB.randint(nblocks)
+    for b in range(nblocks):
+        block = blocks[(start + b) % nblocks]
+        deltas = probl.compute_delta_cost_batch(block)
+        improving = np.flatnonzero(deltas < 0)
+        if len(improving) > 0:
+            i = improving[0]
+            return block[i], deltas[i]
+    return None
+
+## The greedy-random-search generic solver.
+## The `probl` object must implement these methods:
+##    init_config()               # returns None [changes internal config]
+##    cost()                      # returns a real number
+##    propose_move()              # returns a (problem-dependent) move
+##    compute_delta_cost(move)    # returns a real number
+##    accept_move(move)           # returns None [changes internal config]
+##    copy()                      # returns a new, independent opbject
+##    display()                   # returns None [optional]
+##    propose_moves(k)            # [optional, only needed with `batch_size`]
+##    compute_delta_cost_batch(moves) # [optional, only needed with `batch_size`
+##                                # or with `mode` other than "random"]
+##    all_moves()                 # [optional, only needed with `mode` other than "random"]
+## With mode="random" (the default), each iteration proposes a random move and
+## accepts it if it doesn't increase the cost. With mode="steepest" or "first",
+## each iteration applies the best (or the first found) improving move of the
+## whole neighbourhood (see `find_move`); each run then stops exactly at a local
+## optimum, and `num_iters` is just an upper bound.
+def greedy(probl, repeats = 1, num_iters = 10, seed = None, debug_delta_cost = False,
+           batch_size = None, verbose = 1, telemetry = False, mode = "random"):
+    if mode not in ("random", "steepest", "first"):
+        raise Exception("mode must be 'random', 'steepest' or 'first'")
+    if mode != "random" and not (hasattr(probl, "all_moves") and
+                                 hasattr(probl, "compute_delta_cost_batch")):
+        raise Exception("the problem can't enumerate its moves, use mode='random'")
+    ## Optionally set up the random number generator state
+    if seed is not None:
+        RB.seed(seed)
+    ## Repeat the optimization from scratch a number of times.
+    best_probl = None
+    best_c = np.inf
+    source = MoveSource(probl, batch_size)
+    runs = Telemetry.Recorder(Telemetry.run_dtype, repeats)
+    start_time = time.perf_counter()
+    for step in range(repeats):
+        run_time = time.perf_counter()
+        probl.init_config()
+        c = probl.cost()
+        last_accepted_t = 0 # useful for inspection (do we have enough num_iters?)
+        source.invalidate()
+        iters = num_iters
+        for t in range(num_iters):
+            if mode != "random":
+                found = find_move(probl, mode)
+                if found is None:
+                    iters = t + 1
+                    break # local optimum
+                move, delta_c = found
+            else:
+                move, delta_c = source.next()
+            ## Optinal (expensive) check that `compute_delta_cost` works
+            if debug_delta_cost:
+                probl_copy = probl.copy()
+                probl_copy.accept_move(move)
+                assert abs(c + delta_c - probl_copy.cost()) < 1e-10
+            if delta_c <= 0:
+                probl.accept_move(move)
+                source.invalidate()
+                c += delta_c
+                last_accepted_t = t
+        now = time.perf_counter()
+        runs.add(c, last_accepted_t, now - start_time, iters / max(now - run_time, 1e-9))
+        if verbose >= 1:
+            print(f"final cost of run {step} = {c} [obtained at t={last_accepted_t}]")
+        if c < best_c:
+            best_c = c
+            best_probl = probl.copy()
+    if verbose >= 1:
+        if hasattr(best_probl, "display"):
+            best_probl.display()
+        print(f"best cost = {best_c}")
+    if telemetry:
+        return best_probl, dict(runs=runs.result())
+    return best_probl
@@ -0,0 +1,99 @@
+import numpy as np
+
+### EXACT SOLUTION OF SMALL INSTANCES (HELD-KARP) ###
+
+## The heuristic solvers (`greedy`, `simann`...) don't tell us how far they
+## are from the optimum. For small instances we can find the optimum exactly,
+## with the dynamic programming algorithm of Held and Karp, in O(2^n n^2) time
+## instead of the O(n!) of trying all the tours. This makes it possible to
+## measure the exact gaps of the heuristics on many small instances.
+##
+## Fix city 0 as the start of the tour. For a set S of the other cities and a
+## city j in S, let C[S,j] be the minimum cost of a path that starts from 0,
+## visits all the cities of S exactly once and ends in j. Then
+##
+##   C[{j},j] = d[0,j]
+##   C[S,j] = min over i in S-{j} of C[S-{j},i] + d[i,j]
+##
+## and the optimal cost is the minimum over j of C[all,j] + d[j,0].
+## The sets are represented as bitmasks: bit j-1 is set if city j is in S.
+##
+## As in the Floyd-Warshall algorithm (see "4_dynamic_programming"), each
+## "layer" of the recursion (here, the sets with k cities) only needs the
+## previous one (the sets with k-1 cities), so we only keep two layers of
+## costs in memory. Within a layer the sets are numbered consecutively, and the
+## array `rank` gives the number of each set within its layer. For each j, the
+## minimum over i is computed for all the sets of the layer at once, with
+## broadcasting (the C of a set which doesn't contain i is infinite, so those
+## i are excluded automatically).
+## To reconstruct the optimal tour we also need to remember the best i for
+## each (S,j): this is kept for all the layers, but in bytes (int8), so it
+## takes 1/8 of the memory of the costs.
+## With n = 20 this takes about a second and 150 MB; each additional city
+## more than doubles both.
+
+## The optimal tour for the matrix of the distances `dist` (anything that can
+## be indexed like a matrix, like the `dist` of `TSP`). Returns the optimal cost
+## and the route.
+def held_karp(dist):
+    n = dist.shape[0]
+    if n < 3:
+        raise Exception("there must be at least 3 cities")
+    if n > 22:
+        raise Exception("too many cities for the exact solution (at most 22)")
+    idx = np.arange(n)
+    d = np.asarray(dist[idx[:,None], idx], dtype=float)
+    m = n - 1  # the cities other than 0, which are 1...m (bit j-1 for city j)
+
+    ## All the sets, grouped by size (the layers)
+    sets = np.arange(1 << m)
+    size = np.zeros(1 << m, dtype=int)
+    for j in range(m):
+        size += (sets >> j) & 1
+    by_size = np.argsort(size, kind="stable")
+    starts = np.searchsorted(size[by_size], np.arange(m + 2))
+    layers = [by_size[starts[k]:starts[k+1]] for k in range(m + 1)]
+    rank = np.zeros(1 << m, dtype=np.int64)
+    for layer in layers:
+        rank[layer] = np.arange(len(layer))
+
+    ## Layer 1: the paths from 0 to j
+    C = np.full((m, m), np.inf)
+    C[rank[1 << idx[:m]], idx[:m]] = d[0,1:]
+    parents = [None, None]
+    for k in range(2, m + 1):
+        layer = layers[k]
+        newC = np.full((len(layer), m), np.inf)
+        parent = np.zeros((len(layer), m), dtype=np.int8)
+        for j in range(m):
+            ## The sets of the layer which contain j, and the same sets without j
+            with_j = np.flatnonzero((layer >> j) & 1)
+            prev = rank[layer[with_j] ^ (1 << j)]
+            total = C[prev] + d[1:,j+1]  # one column for each last city i
+            best = np.argmin(total, axis=1)
+            newC[with_j, j] = total[np.arange(len(with_j)), best]
+            parent[with_j, j] = best
+        C = newC
+        parents.append(parent)
+
+    ## Close the tour, then go back along the parents
+    total = C[0] + d[1:,0]
+    j = int(np.argmin(total))
+    cost = total[j]
+    route = np.zeros(n, dtype=int)
+    S = (1 << m) - 1
+    for k in range(m, 0, -1):
+        route[k] = j + 1
+        if k > 1:
+            i = int(parents[k][rank[S], j])
+            S ^= 1 << j
+            j = i
+    return cost, route
+
+## Solve a problem instance exactly: returns a copy of `probl` with the optimal
+## route (so it can be used like the result of `simann`)
+def solve(probl):
+    cost, route = held_karp(probl.dist)
+    best = probl.copy()
+    best.restore(route)
+    return best
@@ -0,0 +1,143 @@
+import os
+import time
+import queue
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+from multiprocessing import Process, Queue
+
+### WATCHING A RUN WITHOUT SLOWING IT DOWN ###
+
+## Calling `display` from a hook of `simann` redraws the whole figure and then
+## waits in `plt.pause`, every time: the solver spends most of its time
+## plotting. Here the plotting is done by a separate process instead, and the
+## solver only sends it a snapshot of the configuration (see `snapshot` and
+## `restore`) from time to time:
+##  * the solver side never waits: if less than 1/fps seconds have passed since
+##    the last frame, it does nothing at all (not even the snapshot); otherwise
+##    it puts the snapshot in a queue with room for a single frame, replacing
+##    the previous frame if it hasn't been drawn yet (it's stale anyway);
+##  * the plotting process keeps a copy of the problem (sent once, at the
+##    start), and for each frame it restores the snapshot into it and calls its
+##    `draw(ax)` method (`TSP`, `Sudoku` and `MaxCut` have one). It draws at
+##    most `fps` frames per second.
+## When there is no display (e.g. on a remote machine, where matplotlib uses the
+## "Agg" backend), the frames can be saved to an image file instead, which is
+## overwritten each time (option `filename`); without a filename, the live view
+## is just disabled and the solver runs as usual.
+##
+## Usage (note: with the multiprocessing module, the script must use the
+## `if __name__ == "__main__":` guard, see "tsplive.py"):
+##     view = LiveView(probl)
+##     best = SA.simann(probl, ..., accept_hook=view.hook)
+##     view.close()
+
+## The backends of matplotlib which can't open a window
+non_interactive = ("agg", "cairo", "pdf", "pgf", "ps", "svg", "template")
+
+## The plotting process. It gets frames `(snapshot, title)` from the queue
+## until it gets None.
+def render(view, frames, fps, filename):
+    ## Lowest priority: if there are not enough CPU cores for both, the solver
+    ## goes first (and more frames are dropped)
+    if hasattr(os, "nice"):
+        os.nice(19)
+    fig, ax = plt.subplots()
+    last = 0.0
+    while True:
+        ## Wait for a frame, keeping the window responsive meanwhile
+        try:
+            frame = frames.get(timeout=0.1) if filename else frames.get_nowait()
+        except queue.Empty:
+            if not filename:
+                plt.pause(0.05)
+            continue
+        if frame is None:
+            break
+        if not filename and not plt.fignum_exists(fig.number):
+            continue # the window was closed: just drain the queue
+        snap, title = frame
+        view.restore(snap)
+        ax.clear()
+        view.draw(ax)
+        ax.set_title(title)
+        if filename:
+            fig.savefig(filename)
+        else:
+            fig.canvas.draw_idle()
+            plt.pause(0.001)
+        ## Cap the frame rate
+        wait = last + 1.0 / fps - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait) if filename else plt.pause(wait)
+        last = time.perf_counter()
+    plt.close(fig)
+
+class LiveView:
+    def __init__(self, probl, fps = 10, filename = None):
+        if not hasattr(probl, "draw"):
+            raise Exception("the problem must implement draw(ax)")
+        if not fps > 0:
+            raise Exception("fps must be positive")
+        self.interval = 1.0 / fps
+        self.last = -np.inf
+        headless = matplotlib.get_backend().lower() in non_interactive
+        self.enabled = filename is not None or not headless
+        if not self.enabled:
+            return
+        self.frames = Queue(maxsize=1)
+        self.process = Process(target=render, args=(probl.copy(), self.frames, fps, filename),
+                               daemon=True)
+        self.process.start()
+
+    ## Whether it's time to send a new frame
+    def due(self):
+        if not self.enabled:
+            return False
+        now = time.perf_counter()
+        if now - self.last < self.interval:
+            return False
+        self.last = now
+        if not self.process.is_alive():
+            self.enabled = False
+            return False
+        return True
+
+    ## Send a frame with the current configuration of `probl` (if it's time)
+    def update(self, probl, title = ""):
+        if self.due():
+            self.put((probl.snapshot(), title))
+
+    ## Put an item in the queue without waiting, replacing the stale frame if
+    ## the queue is full (in the unlikely case that it's still full, because
+    ## the stale frame was still on its way, the new one is dropped)
+    def put(self, item):
+        try:
+            self.frames.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            self.frames.put_nowait(item)
+        except queue.Full:
+            pass
+
+    ## A hook for `simann` (as `accept_hook` or `mc_hook`)
+    def hook(self, probl, best, beta, cost, accrate):
+        if self.due():
+            self.put((probl.snapshot(), f"beta={beta:.4g} cost={cost:.6g} acc.rate={accrate:.3f}"))
+
+    ## Send the last frame (e.g. the best configuration) and stop the plotting
+    ## process, after it has drawn all the frames
+    def close(self, probl = None, title = "final"):
+        if not self.enabled:
+            return
+        if probl is not None:
+            self.put((probl.snapshot(), title))
+        while self.process.is_alive():
+            try:
+                self.frames.put(None, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        self.process.join()
+        self.enabled = False
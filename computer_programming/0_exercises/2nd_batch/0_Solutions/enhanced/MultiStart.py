@@ -0,0 +1,92 @@
+import numpy as np
+from multiprocessing import Pool
+
+import RandBuffer as RB
+
+### MULTI-START DRIVER ###
+
+## Runs a solver (`simann`, `greedy`, ...) several times from scratch on the
+## same problem, in parallel, and keeps the best result.
+##
+## The delicate part is the random number generation: all our solvers and
+## problems use the global numpy random state, and each run must have its own
+## independent stream. We use a `SeedSequence` for this: it is "spawned" into
+## one child sequence per run, and each worker seeds its (private) global
+## state from its child. The children are guaranteed to produce independent
+## streams, and the whole thing is reproducible given the master seed,
+## regardless of how the runs are distributed among the processes.
+## (The seeding goes through "RandBuffer.py", which also flushes the buffer
+## of random numbers that a worker may have inherited from the parent.)
+
+## Runs the solver once and returns the best cost, the best configuration and
+## the telemetry of the run (None without the `telemetry` option).
+## It's executed by the workers, so it must be a module-level function.
+## The solvers are not all consistent about what they return: `simann` and
+## the `greedy` of this directory return the best configuration, or a
+## `(best_config, stats)` tuple with the `telemetry` option, but some older
+## versions of `greedy` return a `(best_cost, best_config)` tuple.
+## We handle all the cases here (the telemetry one is recognized from the
+## option, not from the result, to avoid any ambiguity).
+def run_once(args):
+    solver, probl, seedseq, kwargs = args
+    RB.seed(seedseq.generate_state(4))
+    res = solver(probl, **kwargs)
+    stats = None
+    if kwargs.get("telemetry", False):
+        best, stats = res
+        best_c = best.cost()
+    elif isinstance(res, tuple):
+        best_c, best = res
+    else:
+        best = res
+        best_c = best.cost()
+    return best_c, best, stats
+
+## The multi-start generic driver.
+##   solver:    a function called as `solver(probl, **kwargs)`
+##   runs:      how many independent runs to perform
+##   processes: size of the process pool (None means: use all the cores;
+##              1 means: don't use a pool at all)
+##   seed:      the master seed (None means: unpredictable)
+##   verbose:   0 prints nothing, 1 prints the final cost of each run and the
+##              best one; it's also passed to the solver
+## Any other keyword argument is passed to the solver (except `seed`, which
+## would make all the runs identical).
+## Returns the best configuration; with `telemetry=True` (passed to the
+## solver), returns a `(best, stats)` tuple instead, where `stats` is the list
+## of the telemetry of all the runs, in order.
+def multistart(solver, probl, runs = 4, processes = None, seed = None, verbose = 1, **kwargs):
+    if "seed" in kwargs:
+        raise Exception("don't pass a seed to the solver, use the `seed` argument of multistart")
+    if runs < 1:
+        raise Exception("runs must be at least 1")
+    kwargs = dict(kwargs, verbose=verbose)
+
+    children = np.random.SeedSequence(seed).spawn(runs)
+    ## Each run gets its own copy of the problem: with a pool this would be
+    ## automatic, but without it the runs would all modify `probl`.
+    tasks = [(solver, probl.copy(), children[k], kwargs) for k in range(runs)]
+
+    ## Only the best cost and configuration of each run (and its telemetry)
+    ## travel back to the parent process; of those we only keep the best one.
+    best_c, best = np.inf, None
+    all_stats = []
+    pool = Pool(processes) if processes != 1 else None
+    mapper = pool.imap if pool is not None else map
+    try:
+        for k, (c, b, stats) in enumerate(mapper(run_once, tasks)):
+            if verbose >= 1:
+                print(f"final cost of run {k} = {c}")
+            all_stats.append(stats)
+            if c < best_c:
+                best_c, best = c, b
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    if verbose >= 1:
+        print(f"best cost = {best_c}")
+    if kwargs.get("telemetry", False):
+        return best, all_stats
+    return best
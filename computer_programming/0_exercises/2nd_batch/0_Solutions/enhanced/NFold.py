@@ -0,0 +1,132 @@
+import numpy as np
+
+import RandBuffer as RB
+
+### REJECTION-FREE MONTE CARLO (the "n-fold way") ###
+
+## At low temperatures almost all the proposed moves get rejected by the
+## Metropolis rule, so most of the time is spent computing delta costs which
+## are then thrown away. If the neighbourhood of a configuration is small
+## enough to be enumerated (e.g. in MaxCut there are only `n` possible flips),
+## we can do better: compute the acceptance probability of every move, and
+## pick directly the next move that *would* be accepted, with probability
+## proportional to its acceptance probability. The number of rejected
+## proposals that we skip in this way is random: each proposal is accepted
+## with probability W/N, where W is the sum of the acceptance probabilities
+## and N the number of moves, so the number of proposals up to the next
+## accepted one follows a geometric distribution, and we can draw it directly.
+## In this way we advance a "time" counter, measured in (equivalent) MCMC
+## steps, and the result is statistically the same as the standard MCMC.
+##
+## The problem must implement:
+##    all_moves()                     # returns an array with all the possible moves
+##    compute_delta_cost_batch(moves) # returns an array of delta costs
+## and optionally:
+##    affected_moves(move)            # returns the indices (in `all_moves()`) of the
+##                                    # moves whose delta cost can change when `move`
+##                                    # is accepted (by default: all of them)
+
+## A "sum tree" is a binary tree where each leaf holds a weight and each
+## internal node holds the sum of its two children (so the root holds the
+## total). We store it in an array: the root is at index 1, the children of
+## node `i` are at `2*i` and `2*i+1`, and the leaves are at the end.
+## It allows to change a weight and to sample a leaf with probability
+## proportional to its weight, both in O(log n) time.
+class SumTree:
+    def __init__(self, n):
+        size = 1
+        while size < n:
+            size *= 2
+        self.n, self.size = n, size
+        self.tree = np.zeros(2 * size)
+
+    ## Set all the weights at once, O(n)
+    def build(self, weights):
+        tree, size = self.tree, self.size
+        tree[size:size+self.n] = weights
+        tree[size+self.n:] = 0.0
+        ## Each level is computed from the one below, with slices
+        l = size
+        while l > 1:
+            tree[l//2:l] = tree[l:2*l:2] + tree[l+1:2*l:2]
+            l //= 2
+
+    ## Set the weights of the leaves `idx` (an array of indices) to `weights`.
+    ## The ancestors are recomputed from their children, level by level.
+    def update(self, idx, weights):
+        tree = self.tree
+        i = np.asarray(idx) + self.size
+        tree[i] = weights
+        while True:
+            i = np.unique(i // 2)
+            tree[i] = tree[2*i] + tree[2*i+1]
+            if i[0] == 1:
+                break
+
+    def total(self):
+        return self.tree[1]
+
+    ## Find the leaf at which the cumulative sum of the weights exceeds `u`
+    ## (with 0 <= u < total). If `u` is uniform, each leaf is found with
+    ## probability proportional to its weight.
+    def find(self, u):
+        tree, i = self.tree, 1
+        while i < self.size:
+            i *= 2
+            if u >= tree[i]:
+                u -= tree[i]
+                i += 1
+        return i - self.size
+
+## The Metropolis acceptance probabilities of moves with the given delta costs
+def accept_probs(deltas, beta):
+    if beta == np.inf:
+        return (deltas <= 0).astype(float)
+    return np.exp(-beta * np.maximum(deltas, 0.0))
+
+## A rejection-free MCMC run at fixed beta, equivalent to `mcmc_steps` steps
+## of the standard one. `c` is the current cost, `best` the `BestTracker` of
+## `simann`, `accept_hook` as in `simann`.
+## Returns the new cost, the number of accepted moves, and the number of
+## (equivalent) MCMC steps actually performed.
+def nfold_run(probl, beta, mcmc_steps, c, best, accept_hook = None):
+    moves = probl.all_moves()
+    nmoves = len(moves)
+    deltas = probl.compute_delta_cost_batch(moves)
+    tree = SumTree(nmoves)
+    tree.build(accept_probs(deltas, beta))
+    time, accepted = 0, 0
+    while True:
+        W = tree.total()
+        if W <= 0:
+            ## Nothing can be accepted any more: we are stuck here
+            time = mcmc_steps
+            break
+        ## The number of proposals up to (and including) the next accepted one
+        time += np.random.geometric(min(W / nmoves, 1.0))
+        if time > mcmc_steps:
+            time = mcmc_steps
+            break
+        ## Pick the move (in the rare case of rounding errors that lead to
+        ## a leaf with zero weight, just try again)
+        while True:
+            i = tree.find(RB.rand() * W)
+            if i < nmoves and tree.tree[tree.size + i] > 0:
+                break
+        probl.accept_move(moves[i])
+        c += deltas[i]
+        accepted += 1
+        if c <= best.c:
+            best.update(probl, c)
+        if accept_hook is not None:
+            hret = accept_hook(probl, best.get(), beta, c, accepted / time)
+            if hret == False:
+                break
+        ## Update the delta costs which have changed
+        if hasattr(probl, "affected_moves"):
+            idx = probl.affected_moves(moves[i])
+        else:
+            idx = np.arange(nmoves)
+        deltas[idx] = probl.compute_delta_cost_batch(moves[idx])
+        tree.update(idx, accept_probs(deltas[idx], beta))
+    return c, accepted, time
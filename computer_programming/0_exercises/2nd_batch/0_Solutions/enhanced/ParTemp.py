@@ -0,0 +1,155 @@
+import numpy as np
+from multiprocessing import Pool
+
+import SimAnn as SA
+import RandBuffer as RB
+
+### PARALLEL TEMPERING (a.k.a. REPLICA EXCHANGE) ###
+
+## Instead of running a single chain through a list of betas, like `simann`
+## does, here we keep one copy (a "replica") of the problem for each beta,
+## and we run all of them at the same time. Every `mcmc_steps` steps we try
+## to exchange the configurations of replicas at neighbouring betas, using
+## the Metropolis rule again, but for the exchange. The effect is that good
+## configurations flow towards the low temperatures, while bad ones go up to
+## the high temperatures where they can escape from local minima.
+##
+## Since the replicas are independent between two exchange attempts, the
+## MCMC runs are executed in a process pool, one task per replica.
+##
+## The `probl` object must implement the same methods required by `simann`.
+
+## A geometric annealing protocol. Usually it's a better choice than a linear
+## one for parallel tempering. Notice that all the betas must be finite here
+## (an infinite beta would never exchange with anything).
+def geombeta(beta0=0.1, beta1=10.0, steps=11):
+    return np.geomspace(beta0, beta1, steps)
+
+## The Metropolis rule for the exchange of two replicas at betas `beta1` and
+## `beta2` and with costs `c1` and `c2`. The exchange is accepted with
+## probability min(1, exp((beta1 - beta2) * (c1 - c2))), which is the same as
+## accepting a move with a delta_cost of `(beta2 - beta1) * (c1 - c2)` at
+## beta=1.
+def accept_swap(beta1, beta2, c1, c2):
+    return SA.accept((beta2 - beta1) * (c1 - c2), 1.0)
+
+## The function executed by the workers: a plain MCMC run at fixed beta.
+## It needs to be a module-level function in order to be sent to the
+## worker processes. It takes a single tuple argument (for `Pool.map`) and
+## returns the updated replica (the workers operate on a copy of it) plus
+## the best configuration found along the way (or None if there wasn't any
+## improvement over `best_c`).
+def mcmc_run(args):
+    probl, beta, mcmc_steps, c, best_c, seed = args
+    ## Each task gets its own seed, otherwise all the processes would generate
+    ## the same random numbers (this also flushes the random numbers buffer
+    ## inherited from the parent process)
+    RB.seed(seed)
+    best = None
+    accepted = 0
+    for t in range(mcmc_steps):
+        move = probl.propose_move()
+        delta_c = probl.compute_delta_cost(move)
+        if SA.accept(delta_c, beta):
+            probl.accept_move(move)
+            c += delta_c
+            accepted += 1
+            if c < best_c:
+                best_c = c
+                best = probl.copy()
+    return probl, c, accepted, best, best_c
+
+## The parallel tempering generic solver.
+##   beta_list:  one beta per replica, in increasing order
+##   swaps:      how many times we attempt the exchanges
+##   mcmc_steps: number of MCMC steps of each replica between two exchanges
+##   processes:  size of the process pool (None means: use all the cores;
+##               1 means: don't use a pool at all)
+##   hook:       executed after every round of exchanges as
+##               `hook(replicas, best, costs)`; if it returns False, the
+##               program gets out of the loop (like the `mc_hook` of `simann`)
+##   verbose:    0 prints nothing, 1 prints one line per round of exchanges and
+##               the exchange rates at the end (as `simann`)
+def partemp(probl,
+            beta_list = geombeta(),
+            swaps = 100, mcmc_steps = 100,
+            processes = None, hook = None,
+            seed = None, verbose = 1):
+    beta_list = np.asarray(beta_list, dtype=float)
+    if not np.all(np.isfinite(beta_list)):
+        raise Exception("all the betas must be finite")
+    if not np.all(np.diff(beta_list) > 0):
+        raise Exception("the betas must be in increasing order")
+    nrep = len(beta_list)
+    if nrep < 2:
+        raise Exception("at least two betas are needed")
+
+    ## Optionally set up the random number generator state. The seeds for the
+    ## workers are drawn from here, so everything is reproducible.
+    if seed is not None:
+        RB.seed(seed)
+
+    ## Set up the replicas, each one with its own initial configuration
+    replicas = []
+    costs = np.zeros(nrep)
+    for k in range(nrep):
+        rep = probl.copy()
+        rep.init_config()
+        replicas.append(rep)
+        costs[k] = rep.cost()
+    if verbose >= 1:
+        print(f"initial costs = {costs}")
+
+    ## Keep the best cost seen so far, and its associated configuration.
+    kbest = np.argmin(costs)
+    best = replicas[kbest].copy()
+    best_c = costs[kbest]
+
+    ## Counters for the exchange acceptance rates between neighbours
+    swap_tried = np.zeros(nrep - 1, dtype=int)
+    swap_accepted = np.zeros(nrep - 1, dtype=int)
+
+    ## The seeds of all the tasks are drawn in advance: without a pool, the
+    ## tasks run in this process and they re-seed the global random state.
+    seeds = np.random.randint(2**32, size=(swaps, nrep), dtype=np.uint64)
+
+    pool = Pool(processes) if processes != 1 else None
+    mapper = pool.map if pool is not None else map
+    try:
+        for r in range(swaps):
+            ## Run all the replicas (in parallel)
+            tasks = [(replicas[k], beta_list[k], mcmc_steps, costs[k], best_c, seeds[r,k])
+                     for k in range(nrep)]
+            accepted = np.zeros(nrep, dtype=int)
+            for k, (rep, c, acc, rbest, rbest_c) in enumerate(mapper(mcmc_run, tasks)):
+                replicas[k], costs[k], accepted[k] = rep, c, acc
+                if rbest is not None and rbest_c < best_c:
+                    best, best_c = rbest, rbest_c
+
+            ## Attempt the exchanges. We alternate between the even and the odd
+            ## pairs, so that each replica is involved in at most one exchange
+            ## per round.
+            for k in range(r % 2, nrep - 1, 2):
+                swap_tried[k] += 1
+                if accept_swap(beta_list[k], beta_list[k+1], costs[k], costs[k+1]):
+                    swap_accepted[k] += 1
+                    replicas[k], replicas[k+1] = replicas[k+1], replicas[k]
+                    costs[k], costs[k+1] = costs[k+1], costs[k]
+
+            if verbose >= 1:
+                print(f"round={r} acc.rates={accepted/mcmc_steps} c={costs[-1]} [best={best_c}]")
+            if hook is not None:
+                hret = hook(replicas, best, costs)
+                if hret == False:
+                    break
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    ## The exchange rates should not be too low anywhere: if they are, the
+    ## betas are too far apart and the replicas don't communicate
+    if verbose >= 1:
+        print(f"swap rates = {swap_accepted / np.maximum(swap_tried, 1)}")
+        print(f"final cost = {best_c}")
+    return best
@@ -0,0 +1,173 @@
+import numpy as np
+from multiprocessing import Pool
+
+import SimAnn as SA
+import RandBuffer as RB
+
+### POPULATION ANNEALING ###
+
+## Instead of annealing a single configuration, we anneal a whole population
+## of `population` configurations (the "replicas") through the same list of
+## betas. Every time that beta is increased, from `beta_old` to `beta_new`,
+## the population is "resampled": each replica gets a weight proportional to
+## exp(-(beta_new - beta_old) * cost), and a new population of the same size
+## is drawn according to those weights. So the replicas with a low cost get
+## duplicated and those with a high cost tend to disappear. Then each replica
+## performs `mcmc_steps` MCMC steps at the new beta, independently.
+## This is better than many independent runs of `simann` on rugged landscapes
+## (e.g. Sudoku) because the effort gets concentrated on the promising regions.
+##
+## The MCMC runs of the replicas are executed in a process pool.
+##
+## The `probl` object must implement the same methods required by `simann`,
+## and also `snapshot` and `restore`. In fact, the population is just a list
+## of snapshots (the configurations alone): when a replica gets duplicated,
+## only its configuration is copied, not the instance data. For the same
+## reason, the problem object itself is sent to each worker process only once,
+## when the pool is started (see `init_worker`); after that, the tasks only
+## carry the snapshots.
+
+## The problem object of the worker, set by `init_worker`. Each process (the
+## main one too, if no pool is used) has its own.
+worker_probl = None
+
+def init_worker(probl):
+    global worker_probl
+    worker_probl = probl
+
+## The function executed by the workers: a plain MCMC run at fixed beta,
+## starting from the configuration `snap` with cost `c`. It returns the final
+## configuration and cost, the number of accepted moves, and the best
+## configuration found along the way (or None if there wasn't any improvement
+## over `best_c`) with its cost.
+def mcmc_run(args):
+    snap, c, beta, mcmc_steps, best_c, seed = args
+    RB.seed(seed)
+    probl = worker_probl
+    probl.restore(snap)
+    best = None
+    accepted = 0
+    for t in range(mcmc_steps):
+        move = probl.propose_move()
+        delta_c = probl.compute_delta_cost(move)
+        if SA.accept(delta_c, beta):
+            probl.accept_move(move)
+            c += delta_c
+            accepted += 1
+            if c < best_c:
+                best_c = c
+                best = probl.snapshot(best)
+    return probl.snapshot(), c, accepted, best, best_c
+
+## Draws `len(weights)` indices, each one with probability proportional to its
+## weight. We use "systematic" resampling: a single random number is used to
+## place evenly spaced points on the cumulative sum of the weights. Compared to
+## independent draws, it's faster and it adds less noise (a replica with
+## weight w gets either floor(w*n) or ceil(w*n) copies, where n is the size
+## of the population).
+def resample(weights):
+    n = len(weights)
+    cumw = np.cumsum(weights)
+    points = (np.random.rand() + np.arange(n)) / n * cumw[-1]
+    return np.minimum(np.searchsorted(cumw, points, side="right"), n - 1)
+
+## The population annealing generic solver.
+##   beta_list:   the annealing protocol (the betas must be finite and in
+##                increasing order)
+##   population:  the number of replicas
+##   mcmc_steps:  number of MCMC steps of each replica at each beta
+##   processes:   size of the process pool (None means: use all the cores;
+##                1 means: don't use a pool at all)
+##   hook:        executed after each beta as `hook(probl, costs)`, where
+##                `probl` holds the best configuration found so far and
+##                `costs` the costs of the population; if it returns False,
+##                the program gets out of the loop
+##   verbose:     0 prints nothing, 1 prints one line per beta (as `simann`)
+## The number of distinct replicas that survive each resampling is printed: if
+## it gets too low, the betas are too far apart (or the population too small).
+def popann(probl,
+           beta_list = SA.linearbeta()[:-1],
+           population = 100, mcmc_steps = 100,
+           processes = None, hook = None,
+           seed = None, verbose = 1):
+    beta_list = np.asarray(beta_list, dtype=float)
+    if not np.all(np.isfinite(beta_list)):
+        raise Exception("all the betas must be finite")
+    if not np.all(np.diff(beta_list) >= 0) or beta_list[0] < 0:
+        raise Exception("the betas must be non-negative and in increasing order")
+    if population < 2:
+        raise Exception("the population must contain at least two replicas")
+    if not (hasattr(probl, "snapshot") and hasattr(probl, "restore")):
+        raise Exception("the problem must implement snapshot and restore")
+
+    ## Optionally set up the random number generator state. The seeds for the
+    ## tasks are drawn from here, so everything is reproducible.
+    if seed is not None:
+        RB.seed(seed)
+
+    ## The initial population, each one with its own random configuration
+    probl = probl.copy()
+    snaps = []
+    costs = np.zeros(population)
+    for r in range(population):
+        probl.init_config()
+        snaps.append(probl.snapshot())
+        costs[r] = probl.cost()
+    if verbose >= 1:
+        print(f"initial costs: min={costs.min()} mean={costs.mean()}")
+
+    ## Keep the best cost seen so far, and its associated configuration.
+    rbest = np.argmin(costs)
+    best_snap, best_c = snaps[rbest], costs[rbest]
+
+    ## Drawn in advance, as in `partemp`: without a pool, the tasks re-seed the
+    ## global random state of this process
+    seeds = np.random.randint(2**32, size=(len(beta_list), population), dtype=np.uint64)
+
+    if processes != 1:
+        pool = Pool(processes, initializer=init_worker, initargs=(probl,))
+        mapper = pool.map
+    else:
+        pool = None
+        init_worker(probl.copy())
+        mapper = map
+    try:
+        beta_old = 0.0
+        for k, beta in enumerate(beta_list):
+            ## Resampling. The weights are computed relative to the minimum
+            ## cost, so that the exponentials can't overflow. The snapshots
+            ## are never modified, so the duplicates can be shared.
+            weights = np.exp(-(beta - beta_old) * (costs - costs.min()))
+            idx = resample(weights)
+            snaps = [snaps[i] for i in idx]
+            costs = costs[idx]
+            survivors = len(np.unique(idx))
+            beta_old = beta
+
+            ## Run all the replicas (in parallel)
+            tasks = [(snaps[r], costs[r], beta, mcmc_steps, best_c, seeds[k,r])
+                     for r in range(population)]
+            accepted = 0
+            for r, (snap, c, acc, rbest, rbest_c) in enumerate(mapper(mcmc_run, tasks)):
+                snaps[r], costs[r] = snap, c
+                accepted += acc
+                if rbest is not None and rbest_c < best_c:
+                    best_snap, best_c = rbest, rbest_c
+
+            if verbose >= 1:
+                print(f"beta={beta} survivors={survivors} acc.rate={accepted/(population*mcmc_steps)}" +
+                      f" mean c={costs.mean()} [best={best_c}]")
+            if hook is not None:
+                probl.restore(best_snap)
+                hret = hook(probl, costs)
+                if hret == False:
+                    break
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    if verbose >= 1:
+        print(f"final cost = {best_c}")
+    probl.restore(best_snap)
+    return probl
@@ -0,0 +1,135 @@
+import numpy as np
+
+### CONSTRAINT PROPAGATION FOR SUDOKU PUZZLES ###
+
+## Before annealing a puzzle, we can fill in all the entries which are forced
+## by simple logic, the same rules that people use with pencil and paper:
+##  * "naked single": an empty cell where only one value is possible (all the
+##    others are already in its row, column or sub-square);
+##  * "hidden single": a value which, in some row, column or sub-square, can
+##    only go in one of the cells;
+##  * "box-line reduction": if, in a sub-square, a value can only go in cells
+##    of the same row (or column), it can't go in the rest of that row outside
+##    of the sub-square (and vice versa, exchanging the roles of the row and
+##    the sub-square).
+## The rules are applied until nothing changes any more. Most newspaper puzzles
+## are solved completely this way; for the others, the annealing has much fewer
+## free entries to deal with.
+##
+## The values that are still possible in each cell ("candidates") are kept as
+## bitmasks: bit v of `cand[i,j]` is set if value v can go in cell (i,j). An
+## int64 is enough for n up to 25 (well, up to 63). Each rule is applied to all
+## the cells at once, with numpy operations on the whole `cand` array or on the
+## n x n x n boolean array `has[i,j,v]` (the same bits, unpacked).
+## The sub-squares are handled by reshaping: `boxes(a)` rearranges a table (or
+## the `has` array) so that row `b` contains the cells of sub-square `b`.
+
+## Rearrange the first two axes of `a` (n x n x ...) so that row `b` of the
+## result contains the n cells of the b-th sub-square (numbered row by row).
+## It's its own inverse.
+def boxes(a):
+    n = a.shape[0]
+    sn = int(np.sqrt(n))
+    rest = a.shape[2:]
+    return a.reshape((sn, sn, sn, sn) + rest).swapaxes(1, 2).reshape((n, n) + rest)
+
+## The bits of `cand` unpacked: `has[i,j,v]` is True if bit v of `cand[i,j]` is set
+def unpack(cand, n):
+    return ((cand[:,:,None] >> np.arange(n)) & 1).astype(bool)
+
+## Returns a copy of the puzzle `init` (a table with -1 in the free entries,
+## as for `Sudoku`) where the entries forced by the rules above are filled in.
+## Raises an Exception if a contradiction is found, i.e. if the puzzle has no
+## solution.
+def presolve(init):
+    init = np.asarray(init)
+    n = init.shape[0]
+    sn = int(np.sqrt(n))
+    if init.shape != (n, n) or sn * sn != n:
+        raise Exception("the puzzle must be a square table, with a square side")
+    if n > 63:
+        raise Exception("the puzzle is too large for the bitmasks")
+    if ((init < -1) | (init >= n)).any():
+        raise Exception("the entries of the puzzle must be between -1 and n-1")
+    table = init.copy()
+    full = (1 << n) - 1
+    cand = np.where(table >= 0, 1 << np.maximum(table, 0), full).astype(np.int64)
+
+    changed = True
+    while changed:
+        fixed = table >= 0
+        ## Each value must appear at most once in each row, column and sub-square
+        for t in (table, table.T, boxes(table)):
+            for row in t:
+                v = row[row >= 0]
+                if len(np.unique(v)) != len(v):
+                    raise Exception("the puzzle has no solution (repeated value)")
+
+        ## Remove the values that are already in the row, column, sub-square
+        bits = np.where(fixed, cand, 0)
+        used_rows = np.bitwise_or.reduce(bits, axis=1)[:,None]
+        used_cols = np.bitwise_or.reduce(bits, axis=0)[None,:]
+        used_boxes = boxes(np.repeat(np.bitwise_or.reduce(boxes(bits), axis=1)[:,None], n, axis=1))
+        old = cand.copy()
+        cand[~fixed] &= ~(used_rows | used_cols | used_boxes)[~fixed]
+        if (cand == 0).any():
+            raise Exception("the puzzle has no solution (a cell with no possible values)")
+
+        ## Box-line reduction
+        has = unpack(cand, n) & ~fixed[:,:,None]
+        for t, inv in ((lambda a: a, lambda a: a), (lambda a: a.swapaxes(0, 1), lambda a: a.swapaxes(0, 1))):
+            h = t(has)  # h[i,j,v], i-th row (or column)
+            ## In which sub-squares of line i value v can go: n x sn x n
+            per_box = h.reshape(n, sn, sn, n).any(axis=2)
+            ## Same, seen from the sub-squares: in which lines of the
+            ## sub-square (band `i // sn`, position `i % sn`) value v can go
+            ## (n x sn x n: for sub-square (I,J) we look at rows I*sn...I*sn+sn-1)
+            per_line = per_box.reshape(sn, sn, sn, n).swapaxes(1, 2).reshape(n, sn, n)
+            remove = np.zeros_like(h)
+            ## Line -> box: if in line i value v can only go in sub-square J,
+            ## remove v from the other lines of that sub-square
+            for i, v in zip(*np.nonzero(per_box.sum(axis=1) == 1)):
+                J = np.argmax(per_box[i,:,v])
+                band = (i // sn) * sn
+                remove[band:band+sn, J*sn:J*sn+sn, v] = True
+                remove[i, J*sn:J*sn+sn, v] = False
+            ## Box -> line: if in sub-square b value v can only go in one line,
+            ## remove v from the rest of that line
+            for b, v in zip(*np.nonzero(per_line.sum(axis=1) == 1)):
+                i = (b // sn) * sn + np.argmax(per_line[b,:,v])
+                J = b % sn
+                remove[i, :, v] = True
+                remove[i, J*sn:J*sn+sn, v] = False
+            remove = inv(remove)
+            cand &= ~np.sum(remove.astype(np.int64) << np.arange(n), axis=2)
+        if (cand == 0).any():
+            raise Exception("the puzzle has no solution (a cell with no possible values)")
+
+        ## Naked singles: the cells with a single candidate (a power of 2)
+        single = ~fixed & ((cand & (cand - 1)) == 0)
+        table[single] = np.log2(cand[single]).round().astype(int)
+
+        ## Hidden singles: the values with a single possible cell in a row,
+        ## column or sub-square. All the rules of this pass look at the same
+        ## candidates (those of the cells that were free at the beginning of
+        ## the pass), so they can't contradict each other, unless the puzzle
+        ## has no solution.
+        has = unpack(cand, n) & ~fixed[:,:,None]
+        index = np.arange(n*n).reshape(n, n)
+        for t in (lambda a: a, lambda a: a.swapaxes(0, 1), boxes):
+            h, cells = t(has), t(index)
+            for i, v in zip(*np.nonzero(h.sum(axis=1) == 1)):
+                cell = cells[i, np.argmax(h[i,:,v])]
+                if table.ravel()[cell] not in (-1, v):
+                    raise Exception("the puzzle has no solution (a cell with two values)")
+                table.ravel()[cell] = v
+        cand[table >= 0] = np.int64(1) << table[table >= 0]
+
+        ## A value which has no place left in some row, column or sub-square
+        has = unpack(cand, n)
+        for t in (lambda a: a, lambda a: a.swapaxes(0, 1), boxes):
+            if not t(has).any(axis=1).all():
+                raise Exception("the puzzle has no solution (a value with no possible place)")
+
+        changed = not (np.array_equal(table >= 0, fixed) and np.array_equal(cand, old))
+    return table
@@ -0,0 +1,75 @@
+import numpy as np
+
+### BLOCK-PREFETCHED RANDOM NUMBERS ###
+
+## Each call to a numpy random function, like `np.random.rand()` or
+## `np.random.randint(n)`, has a fixed overhead which is much larger than the
+## cost of actually generating a single number. In the inner loop of `simann`
+## we call them several times per step, and for cheap moves (e.g. in TSP or
+## MaxCut) this overhead dominates.
+##
+## The idea here is to generate the uniform numbers in large blocks (one numpy
+## call per block) and hand them out one at a time. Random integers in
+## [0, n) are obtained from the uniform numbers as `int(u * n)`.
+##
+## The blocks are drawn from the global numpy random state, so seeding with
+## `np.random.seed` still makes everything reproducible, PROVIDED that the
+## buffer is flushed at the same time (otherwise we would keep handing out
+## numbers generated before seeding). Use the `seed` function below for that.
+
+class RandBuffer:
+    def __init__(self, block=4096):
+        if not isinstance(block, int) or block <= 0:
+            raise Exception("block must be a positive integer")
+        self.block = block
+        self.flush()
+
+    ## Throw away any number generated so far
+    def flush(self):
+        self.buf = []
+        self.pos = 0
+
+    def refill(self):
+        ## We convert to a list because reading a Python float out of a list
+        ## is much faster than reading a numpy scalar out of an array
+        self.buf = np.random.rand(self.block).tolist()
+        self.pos = 0
+
+    ## A uniform number in [0,1), same as `np.random.rand()`
+    def rand(self):
+        if self.pos == len(self.buf):
+            self.refill()
+        u = self.buf[self.pos]
+        self.pos += 1
+        return u
+
+    ## A uniform integer in [0,n), same as `np.random.randint(n)`
+    def randint(self, n):
+        return int(self.rand() * n)
+
+## A default, shared buffer. The functions are exported at module level, so
+## that the problems can just `import RandBuffer as RB` and call
+## `RB.randint(n)` or `RB.rand()`.
+default_buffer = RandBuffer()
+rand = default_buffer.rand
+randint = default_buffer.randint
+flush = default_buffer.flush
+
+## The whole state (the global random state plus the default buffer), as a
+## dict of arrays; it can be saved with `np.savez` and set back with `set_state`
+def get_state():
+    name, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+    return dict(keys=keys, pos=pos, has_gauss=has_gauss, cached_gaussian=cached_gaussian,
+                buf=np.array(default_buffer.buf, dtype=float), bufpos=default_buffer.pos)
+
+def set_state(state):
+    np.random.set_state(("MT19937", state["keys"], int(state["pos"]),
+                         int(state["has_gauss"]), float(state["cached_gaussian"])))
+    default_buffer.buf = state["buf"].tolist()
+    default_buffer.pos = int(state["bufpos"])
+
+## Seed the global random state and flush the buffer. It accepts anything that
+## `np.random.seed` accepts.
+def seed(s):
+    np.random.seed(s)
+    flush()
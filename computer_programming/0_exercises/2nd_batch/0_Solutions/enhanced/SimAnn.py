@@ -1,4 +1,10 @@
 import numpy as np
+import os
+import time
+
+import RandBuffer as RB
+import Telemetry
+import NFold
 
 ### ENHANCED VERSION ###
 
@@ -20,6 +26,10 @@ import numpy as np
 ##  2. Pass a hook that checks if cost==0, and if so returns False. So you can
 ##     exit as soon as you find a zero-cost configuration (e.g. in Sudoku and
 ##     similar problems), without waiting for the annealing to end.
+##
+## The random numbers used in the acceptance rule come from the block-prefetched
+## buffer of "RandBuffer.py" (so does the seeding), as in the problems of this
+## directory.
 
 
 ## Stochastically determine whether to acccept a move according to the
@@ -34,7 +44,7 @@ def accept(delta_c, beta):
     ## Otherwise the probability is going to be somwhere between 0 and 1
     p = np.exp(-beta * delta_c)
     ## Returns True with probability p
-    return np.random.rand() < p
+    return RB.rand() < p
 
 ## A couple of standard annealing protocols
 def linearT(T0=1.0, steps=11):
@@ -48,6 +58,96 @@ def linearbeta(beta0=1.0, beta1=10.0, steps=11):
     beta_list[-1] = np.inf
     return beta_list
 
+## Finds the beta at which a fraction `acc` of the uphill moves (those with
+## positive delta cost) would be accepted by the Metropolis rule, given a sample
+## of delta costs. It uses bisection. (The downhill moves are always accepted,
+## so they are not informative here.)
+def estimate_beta(deltas, acc):
+    deltas = np.asarray(deltas, dtype=float)
+    pos = deltas[deltas > 0]
+    if len(pos) == 0:
+        raise Exception("no moves with positive delta cost were found")
+    ## Acceptance rate of the uphill moves at a given beta (it decreases with beta)
+    def accrate(beta):
+        return np.exp(-beta * pos).mean()
+    lo, hi = 0.0, 1 / pos.mean()
+    while accrate(hi) > acc:
+        lo, hi = hi, 2 * hi
+    for it in range(60):
+        mid = (lo + hi) / 2
+        if accrate(mid) > acc:
+            lo = mid
+        else:
+            hi = mid
+    return (lo + hi) / 2
+
+## An adaptive annealing protocol. It can be passed as the `beta_list` of
+## `simann`, which will then report the results of each MCMC run back to it
+## (by calling its `update` method), so that the next beta is chosen based on
+## what happened. In this way there is no need to tune beta0, beta1 and the
+## number of steps by trial and error.
+##  * The initial beta is chosen so that a fraction `acc0` of the uphill moves
+##    is accepted. To estimate it, we sample `samples` moves from a random walk.
+##  * At each step beta is multiplied by a factor. If the acceptance rate
+##    dropped by more than a factor `min_ratio` with respect to the previous
+##    step, we were going too fast and the increment is halved; if it dropped
+##    by less than `max_ratio`, we were going too slow and it's doubled.
+##  * The annealing stops when the acceptance rate is below `acc_min` and the
+##    best cost hasn't improved for `patience` steps (or after `max_steps`
+##    steps anyway). At the end, an infinite beta is used, as in `linearbeta`.
+## NOTE: this calls `probl.init_config()` and changes the configuration.
+class AdaptiveBeta:
+    def __init__(self, probl, acc0=0.8, growth=1.5,
+                 min_ratio=0.5, max_ratio=0.9,
+                 acc_min=0.01, patience=3, max_steps=100,
+                 samples=1000):
+        if not 0 < acc0 < 1:
+            raise Exception("acc0 must be between 0 and 1")
+        if growth <= 1:
+            raise Exception("growth must be larger than 1")
+        probl.init_config()
+        deltas = np.zeros(samples)
+        for k in range(samples):
+            move = probl.propose_move()
+            deltas[k] = probl.compute_delta_cost(move)
+            probl.accept_move(move)
+        self.beta0 = estimate_beta(deltas, acc0)
+        self.growth = growth
+        self.min_ratio, self.max_ratio = min_ratio, max_ratio
+        self.acc_min, self.patience, self.max_steps = acc_min, patience, max_steps
+        self.accrate, self.best_c = None, None
+
+    ## Called by `simann` at the end of each MCMC run
+    def update(self, accrate, best_c):
+        self.accrate, self.best_c = accrate, best_c
+
+    def __iter__(self):
+        beta, growth = self.beta0, self.growth
+        prev_acc, prev_best = None, np.inf
+        stale = 0
+        for k in range(self.max_steps):
+            self.accrate = None
+            yield beta
+            acc, best_c = self.accrate, self.best_c
+            if acc is None:
+                raise Exception("the results of the MCMC run were not reported")
+            ## Check for the plateau
+            if best_c < prev_best:
+                prev_best, stale = best_c, 0
+            else:
+                stale += 1
+            if acc < self.acc_min and stale >= self.patience:
+                break
+            ## Adjust the increment
+            if prev_acc is not None and prev_acc > 0:
+                if acc < self.min_ratio * prev_acc:
+                    growth = 1 + (growth - 1) / 2
+                elif acc > self.max_ratio * prev_acc:
+                    growth = 1 + (growth - 1) * 2
+            prev_acc = acc
+            beta *= growth
+        yield np.inf
+
 ## An auxiliary function used for debugging (instead of the `debug_delta_cost` option).
 ## You can pass it as the `accept_hook` argument of `simann`.
 ## However, this will only check accepted moves, instead of
@@ -56,6 +156,138 @@ def debug_hook(probl, best, beta, cost, accrate):
     # print("cost=", cost, "probl.cost()=", probl.cost())
     assert abs(cost - probl.cost()) < 1e-10
 
+## Keeps track of the best configuration seen so far.
+## Copying the whole problem each time that we find a new best is wasteful,
+## since most of the data (e.g. the distances in TSP) never changes. If the
+## problem supports snapshots (see below), we just copy its configuration
+## into a preallocated buffer, and we put it back into the `best` object
+## only when somebody actually asks for it.
+class BestTracker:
+    def __init__(self, probl, c):
+        self.best = probl.copy()
+        self.c = c
+        self.snap = probl.snapshot() if hasattr(probl, "snapshot") else None
+        self.synced = True
+
+    ## Record the current configuration of `probl` (with cost `c`) as the best
+    def update(self, probl, c):
+        self.c = c
+        if self.snap is None:
+            self.best = probl.copy()
+        else:
+            probl.snapshot(self.snap)
+            self.synced = False
+
+    ## Returns the best configuration, as a problem object
+    def get(self):
+        if not self.synced:
+            self.best.restore(self.snap)
+            self.synced = True
+        return self.best
+
+## Hands out the moves to try, together with their delta costs.
+## If `batch_size` is None, it just calls `propose_move` and
+## `compute_delta_cost` for each move. Otherwise, it proposes and evaluates
+## `batch_size` moves at once, using the (optional) methods `propose_moves`
+## and `compute_delta_cost_batch` of the problem, and then hands them out one
+## at a time. The delta costs are only valid as long as the configuration
+## doesn't change: whenever a move is accepted, `invalidate` must be called,
+## and the rest of the batch is thrown away. (This is fine because the
+## proposals don't depend on the configuration, they are just random numbers.)
+## When most moves get accepted (e.g. at high temperature) the batches would be
+## mostly thrown away, so the size of the batches adapts to the number of
+## moves that actually get used, and for very small sizes it falls back to
+## evaluating one move at a time.
+class MoveSource:
+    def __init__(self, probl, batch_size = None):
+        if batch_size is not None:
+            if not isinstance(batch_size, int) or batch_size <= 0:
+                raise Exception("batch_size must be a positive integer")
+            if not (hasattr(probl, "propose_moves") and hasattr(probl, "compute_delta_cost_batch")):
+                raise Exception("the problem doesn't support batched moves")
+        self.probl = probl
+        self.batch_size = batch_size
+        self.k = batch_size  # current (adaptive) batch size
+        self.moves, self.deltas = [], []
+        self.pos = 0
+
+    def invalidate(self):
+        if self.batch_size is not None:
+            ## Aim for about twice the number of moves used in this batch
+            ## (or start again from single moves if we weren't using batches)
+            self.k = max(1, min(self.batch_size, 2 * self.pos))
+        self.moves, self.deltas = [], []
+        self.pos = 0
+
+    def next(self):
+        probl = self.probl
+        if self.pos == len(self.moves):
+            ## Below this size a batch is slower than single moves
+            if self.batch_size is None or self.k < 8:
+                if self.batch_size is not None:
+                    self.k += 1
+                move = probl.propose_move()
+                return move, probl.compute_delta_cost(move)
+            moves = probl.propose_moves(self.k)
+            deltas = probl.compute_delta_cost_batch(moves)
+            ## Python lists are faster to read one element at a time
+            self.moves, self.deltas = moves.tolist(), deltas.tolist()
+            self.pos = 0
+            self.k = min(self.batch_size, 2 * self.k)
+        i = self.pos
+        self.pos += 1
+        return self.moves[i], self.deltas[i]
+
+    ## The pending batch, for the checkpoints (a dict of arrays)
+    def get_state(self):
+        return dict(moves=np.array(self.moves), deltas=np.array(self.deltas, dtype=float),
+                    pos=self.pos, k=-1 if self.k is None else self.k)
+
+    def set_state(self, state):
+        self.moves, self.deltas = state["moves"].tolist(), state["deltas"].tolist()
+        self.pos = state["pos"].item()
+        k = state["k"].item()
+        self.k = None if k == -1 else k
+
+## Checkpoints: we save everything that is needed to continue a run exactly
+## where it stopped in a compressed ".npz" file. The configurations are
+## obtained from the `serialize` method of the problem, which returns a dict
+## of arrays, and are set back with `deserialize`. The file is first written
+## under a temporary name and then renamed, so that a crash while writing
+## doesn't destroy the previous checkpoint.
+def save_checkpoint(filename, probl, best, c, beta_list, mcmc_steps,
+                    k, t, accepted, step, source, nfold):
+    data = {}
+    for key, val in probl.serialize().items():
+        data["cur_" + key] = val
+    for key, val in best.get().serialize().items():
+        data["best_" + key] = val
+    data.update(c=c, best_c=best.c, beta_list=beta_list, mcmc_steps=mcmc_steps,
+                k=k, t=t, accepted=accepted, step=step, nfold=nfold)
+    for key, val in RB.get_state().items():
+        data["rb_" + key] = val
+    for key, val in source.get_state().items():
+        data["src_" + key] = val
+    tmpname = filename + ".tmp"
+    with open(tmpname, "wb") as f:
+        np.savez_compressed(f, **data)
+    os.replace(tmpname, filename)
+
+## Loads a checkpoint into `probl`; returns the rest of the state in a dict.
+def load_checkpoint(filename, probl):
+    with np.load(filename) as f:
+        data = {key: f[key] for key in f.files}
+    def extract(prefix):
+        return {key[len(prefix):]: val for key, val in data.items() if key.startswith(prefix)}
+    probl.deserialize(extract("cur_"))
+    bestprobl = probl.copy()
+    bestprobl.deserialize(extract("best_"))
+    RB.set_state(extract("rb_"))
+    state = {key: data[key].item() for key in ("c", "best_c", "mcmc_steps", "k", "t", "accepted", "step")}
+    state.update(bestprobl=bestprobl, beta_list=data["beta_list"], source=extract("src_"),
+                 nfold=bool(data["nfold"]) if "nfold" in data else False)
+    return state
+
 ## The simulated annealing generic solver.
 ## Assumes that the proposals are symmetric.
 ## The `probl` object must implement these methods:
@@ -65,52 +297,169 @@ def debug_hook(probl, best, beta, cost, accrate):
 ##    compute_delta_cost(move)    # returns a real number
 ##    accept_move(move)           # returns None [changes internal config]
 ##    copy()                      # returns a new, independent opbject
+## Optionally, it can also implement these (all the problems in this directory do):
+##    snapshot(buf=None)          # returns a copy of the configuration alone (if `buf`
+##                                # is given, the configuration is copied into it)
+##    restore(buf)                # returns None [sets the config from a snapshot]
+##    propose_moves(k)            # returns an array of k moves
+##    compute_delta_cost_batch(moves) # returns an array of delta costs
+##    serialize()                 # returns a dict of arrays with the configuration
+##    deserialize(data)           # returns None [sets the config from `serialize` output]
+##    all_moves()                 # returns an array with all the possible moves
+## `propose_moves` and `compute_delta_cost_batch` are needed only if `batch_size`
+## is used (see `MoveSource`). `serialize` and `deserialize` are needed only for
+## checkpointing: if `checkpoint` is a file name, the state of the run is saved
+## there every `checkpoint_every` MCMC steps, and the run can be continued
+## with `resume` (see below).
+## If `nfold_threshold` is given and the problem implements `all_moves` (and
+## `compute_delta_cost_batch`), as soon as the acceptance rate of an MCMC run
+## drops below the threshold, all the following runs use the rejection-free
+## mode of "NFold.py" instead of the standard one. The `mcmc_steps` are then
+## counted as the equivalent number of standard steps (so the acceptance rates
+## are comparable). Those runs can't be interrupted, so the checkpoints are
+## written between them: at the start of a run, if `checkpoint_every` steps
+## have passed during the previous one.
+## The amount of printed output is controlled by `verbose` (0: nothing, 1: one
+## line per MCMC run, 2: also one line every `sample_every` steps). If
+## `telemetry` is True, the statistics are also recorded (see "Telemetry.py")
+## and the function returns a tuple `(best, stats)`, where `stats` is a dict
+## with the record arrays "stages" (one row per MCMC run) and "samples" (one
+## row every `sample_every` steps, if `sample_every` is given).
 ## NOTE: The default beta0 and beta1 are arbitrary.
 def simann(probl,
            anneal_steps = 10, mcmc_steps = 100,
            beta_list = linearbeta(),
            accept_hook = None, mc_hook = None,
-           seed = None, debug_delta_cost = False):
-    ## Optionally set up the random number generator state
-    if seed is not None:
-        np.random.seed(seed)
+           seed = None, debug_delta_cost = False,
+           batch_size = None,
+           checkpoint = None, checkpoint_every = 10**5,
+           resume_from = None,
+           verbose = 1, telemetry = False, sample_every = None,
+           nfold_threshold = None):
+    if nfold_threshold is not None and not (hasattr(probl, "all_moves") and
+                                            hasattr(probl, "compute_delta_cost_batch")):
+        raise Exception("the problem doesn't support the rejection-free mode")
+    if checkpoint is not None and hasattr(beta_list, "update"):
+        raise Exception("checkpoints are not supported with adaptive protocols")
+
+    source = MoveSource(probl, batch_size)
+
+    ## Set up the telemetry; sampling is done only if needed
+    if sample_every is not None and not (telemetry or verbose >= 2):
+        sample_every = None
+    stages = Telemetry.Recorder(Telemetry.stage_dtype,
+                                len(beta_list) if hasattr(beta_list, "__len__") else 64)
+    samples = Telemetry.Recorder(Telemetry.sample_dtype)
+    start_time = time.perf_counter()
 
-    # Set up the initial configuration, compute and print the initial cost
-    probl.init_config()
-    c = probl.cost()
-    print(f"initial cost = {c}")
+    if resume_from is None:
+        ## Optionally set up the random number generator state
+        if seed is not None:
+            RB.seed(seed)
 
-    ## Keep the best cost seen so far, and its associated configuration.
-    best = probl.copy()
-    best_c = c
+        # Set up the initial configuration, compute and print the initial cost
+        probl.init_config()
+        c = probl.cost()
+        if verbose >= 1:
+            print(f"initial cost = {c}")
+
+        ## Keep the best cost seen so far, and its associated configuration.
+        best = BestTracker(probl, c)
+
+        ## Where to start from: beta index, MCMC step, accepted moves so far
+        ## in the current MCMC run, total number of steps
+        k0, t0, accepted0, step = 0, 0, 0, 0
+
+        ## Whether we have switched to the rejection-free mode
+        nfold = False
+    else:
+        ## Continue from a checkpoint: the protocol and the number of steps
+        ## are read from the file, the seed is ignored
+        state = load_checkpoint(resume_from, probl)
+        c = state["c"]
+        best = BestTracker(state["bestprobl"], state["best_c"])
+        beta_list, mcmc_steps = state["beta_list"], state["mcmc_steps"]
+        source.set_state(state["source"])
+        k0, t0, accepted0, step = state["k"], state["t"], state["accepted"], state["step"]
+        nfold = state["nfold"]
+        if verbose >= 1:
+            print(f"resuming from beta={beta_list[k0]} t={t0} cost = {c}")
+
+    ## The step of the last checkpoint
+    saved = step
 
     # Main loop of the annaling: Loop over the betas
-    for beta in beta_list:
+    for k, beta in enumerate(beta_list):
+        if k < k0:
+            continue
         ## At each beta, we want to record the acceptance rate, so we need a
         ## counter for the number of accepted moves
-        accepted = 0
+        accepted = accepted0 if k == k0 else 0
+        tstart = t0 if k == k0 else 0
+        stage_time, stage_step = time.perf_counter(), step
+        if nfold:
+            if checkpoint is not None and step // checkpoint_every > saved // checkpoint_every:
+                save_checkpoint(checkpoint, probl, best, c, beta_list, mcmc_steps,
+                                k, 0, 0, step, source, nfold)
+                saved = step
+            c, accepted, nsteps = NFold.nfold_run(probl, beta, mcmc_steps, c, best, accept_hook)
+            step += nsteps
+            tstart = mcmc_steps # skip the standard MCMC
         # For each beta, perform a number of MCMC steps
-        for t in range(mcmc_steps):
-            move = probl.propose_move()
-            delta_c = probl.compute_delta_cost(move)
+        for t in range(tstart, mcmc_steps):
+            if checkpoint is not None and step % checkpoint_every == 0 and step > 0:
+                save_checkpoint(checkpoint, probl, best, c, beta_list, mcmc_steps,
+                                k, t, accepted, step, source, nfold)
+                saved = step
+            if sample_every is not None and step % sample_every == 0:
+                now = time.perf_counter() - start_time
+                samples.add(step, beta, accepted / max(t, 1), c, best.c, now)
+                if verbose >= 2:
+                    print(f"  step={step} acc.rate={accepted / max(t, 1)} c={c} [best={best.c}]")
+            step += 1
+            move, delta_c = source.next()
             ## Metropolis rule
             if accept(delta_c, beta):
                 probl.accept_move(move)
+                source.invalidate()
                 c += delta_c
                 accepted += 1
-                if c <= best_c:
-                    best_c = c
-                    best = probl.copy()
+                if c <= best.c:
+                    best.update(probl, c)
                 if accept_hook is not None:
-                    hret = accept_hook(probl, best, beta, c, accepted / (t+1))
+                    hret = accept_hook(probl, best.get(), beta, c, accepted / (t+1))
                     if hret == False: # note: we need the explicit comparison here
                         break
-        print(f"acc.rate={accepted/mcmc_steps} beta={beta} c={c} [best={best_c}]")
+        now = time.perf_counter()
+        stages.add(beta, accepted / mcmc_steps, c, best.c, now - start_time,
+                   (step - stage_step) / max(now - stage_time, 1e-9))
+        if verbose >= 1:
+            print(f"acc.rate={accepted/mcmc_steps} beta={beta} c={c} [best={best.c}]")
+        if nfold_threshold is not None and not nfold and accepted / mcmc_steps < nfold_threshold:
+            nfold = True
+            if verbose >= 1:
+                print("switching to the rejection-free mode")
+        ## Adaptive protocols want to know how it went
+        if hasattr(beta_list, "update"):
+            beta_list.update(accepted / mcmc_steps, best.c)
         if mc_hook is not None:
-            hret = mc_hook(probl, best, beta, c, accepted / mcmc_steps)
+            hret = mc_hook(probl, best.get(), beta, c, accepted / mcmc_steps)
             if hret == False:
                 break
 
     ## Return the best instance
-    print(f"final cost = {best_c}")
-    return best
+    if verbose >= 1:
+        print(f"final cost = {best.c}")
+    if telemetry:
+        return best.get(), dict(stages=stages.result(), samples=samples.result())
+    return best.get()
+
+## Continue a run from a checkpoint file written by `simann`. The `probl` object
+## must be the same problem instance (e.g. constructed with the same arguments
+## and seed): only its configuration is read from the file. The other arguments
+## are the same as for `simann` (by default, the checkpoints keep being written
+## to the same file).
+def resume(probl, filename, checkpoint = "same", **kwargs):
+    if checkpoint == "same":
+        checkpoint = filename
+    return simann(probl, resume_from = filename, checkpoint = checkpoint, **kwargs)
@@ -0,0 +1,221 @@
+import numpy as np
+import math
+
+### NEAREST NEIGHBOURS ON A GRID ###
+
+## Finding the `k` nearest neighbours of each city by computing all the
+## distances takes O(n^2) time and memory, which is not feasible for large n.
+## Instead, we divide the plane into a grid of square cells, with about two
+## cities per cell. The neighbours of a city can only be in the nearby cells:
+## we look at the block of cells around the city's cell that extends by `r`
+## cells in each direction, and we increase `r` until the block contains at
+## least `k` other cities AND the k-th nearest one is at a distance smaller
+## than `r` cells (otherwise there might be a closer one just outside of the
+## block). For cities which are more or less uniformly spread, this takes
+## O(n k log k) time overall.
+## All the cities in a cell are processed together, with broadcasting.
+
+## Returns an `n x k` array of indices: row `i` contains the `k` nearest
+## neighbours of city `i` (excluding `i` itself), sorted by distance.
+## With `return_dist=True`, it also returns the `n x k` array of the
+## corresponding distances.
+def knn(x, y, k, return_dist = False):
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    n = len(x)
+    if not (isinstance(k, int) and 0 < k < n):
+        raise Exception("k must be a positive int smaller than the number of cities")
+
+    ## The grid: g x g cells of side h
+    g = max(1, int(np.sqrt(n / 2)))
+    x0, y0 = x.min(), y.min()
+    h = max(x.max() - x0, y.max() - y0, 1e-300) / g
+    cx = np.minimum(((x - x0) / h).astype(int), g-1)
+    cy = np.minimum(((y - y0) / h).astype(int), g-1)
+
+    ## Sort the cities by cell. The cell index is `cx * g + cy`, so that the
+    ## cells of a column of the grid are contiguous: the cities of the cells
+    ## from (i,j0) to (i,j1) are `order[starts[i*g+j0]:starts[i*g+j1+1]]`
+    cell = cx * g + cy
+    order = np.argsort(cell, kind="stable")
+    starts = np.searchsorted(cell[order], np.arange(g*g + 1))
+
+    neigh = np.zeros((n, k), dtype=int)
+    for i in range(g):
+        for j in range(g):
+            pts = order[starts[i*g+j]:starts[i*g+j+1]]
+            if len(pts) == 0:
+                continue
+            r = 1
+            while True:
+                i0, i1 = max(i-r, 0), min(i+r, g-1)
+                j0, j1 = max(j-r, 0), min(j+r, g-1)
+                cand = np.concatenate([order[starts[ii*g+j0]:starts[ii*g+j1+1]]
+                                       for ii in range(i0, i1+1)])
+                whole = i0 == 0 and j0 == 0 and i1 == g-1 and j1 == g-1
+                if len(cand) > k:
+                    d = np.sqrt((x[pts,None] - x[cand])**2 + (y[pts,None] - y[cand])**2)
+                    d[pts[:,None] == cand] = np.inf # exclude the city itself
+                    idx = np.argpartition(d, k-1, axis=1)[:,:k]
+                    dk = np.take_along_axis(d, idx, axis=1)
+                    if whole or dk.max() <= r * h:
+                        srt = np.argsort(dk, axis=1)
+                        neigh[pts] = cand[np.take_along_axis(idx, srt, axis=1)]
+                        break
+                r += 1
+    if return_dist:
+        ndist = np.sqrt((x[:,None] - x[neigh])**2 + (y[:,None] - y[neigh])**2)
+        return neigh, ndist
+    return neigh
+
+## The same, for instances given by a full matrix of distances (which need
+## not be Euclidean, e.g. those read from TSPLIB files): the neighbours are
+## just found by sorting each row.
+def knn_matrix(dist, k, return_dist = False):
+    dist = np.asarray(dist)
+    n = len(dist)
+    if not (isinstance(k, int) and 0 < k < n):
+        raise Exception("k must be a positive int smaller than the number of cities")
+    d = dist.astype(float) # a copy, since we change the diagonal
+    np.fill_diagonal(d, np.inf) # exclude the city itself
+    idx = np.argpartition(d, k-1, axis=1)[:,:k]
+    dk = np.take_along_axis(d, idx, axis=1)
+    srt = np.argsort(dk, axis=1, kind="stable")
+    neigh = np.take_along_axis(idx, srt, axis=1)
+    if return_dist:
+        return neigh, np.take_along_axis(dk, srt, axis=1)
+    return neigh
+
+### DISTANCES ###
+
+## The full matrix of the distances between all the pairs of cities, with the
+## given `dtype` (e.g. np.float32 halves the memory). It's computed a block of
+## rows at a time, so that the temporary arrays of the broadcasting don't take
+## more memory than the result itself.
+def dense_distances(x, y, dtype = float):
+    n = len(x)
+    dist = np.zeros((n, n), dtype=dtype)
+    block = max(1, 2**22 // n)
+    for i in range(0, n, block):
+        xb, yb = x[i:i+block,None], y[i:i+block,None]
+        dist[i:i+block] = np.sqrt((x - xb)**2 + (y - yb)**2)
+    return dist
+
+## A replacement for the matrix of the distances, for very large instances:
+## it takes O(n) memory instead of O(n^2), because the distances are computed
+## from the coordinates when they are requested. It can be indexed like the
+## matrix, either with two integers, `dist[i,j]`, or with two arrays (fancy
+## indexing), `dist[cities1,cities2]`, so the code which uses the matrix works
+## unchanged.
+class ImplicitDistances:
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+        ## For single entries, Python floats are faster than numpy scalars
+        self.xl, self.yl = x.tolist(), y.tolist()
+        self.shape = (len(x), len(x))
+
+    def __getitem__(self, ij):
+        i, j = ij
+        if isinstance(i, (int, np.integer)) and isinstance(j, (int, np.integer)):
+            xl, yl = self.xl, self.yl
+            return math.sqrt((xl[i] - xl[j])**2 + (yl[i] - yl[j])**2)
+        x, y = self.x, self.y
+        return np.sqrt((x[i] - x[j])**2 + (y[i] - y[j])**2)
+
+### A GRID FOR NEAREST-NEIGHBOUR QUERIES ###
+
+## The same kind of grid used by `knn`, but for a set of cities which can
+## shrink: `nearest(c)` returns the nearest city to city `c` among those still
+## in the grid, and `remove(c)` removes a city. It's used to build tours
+## incrementally (see "Construct.py"). The search looks at the "rings" of
+## cells around the cell of `c`, at distance 0, 1, 2... (in cells), and stops
+## as soon as the best city found is closer than the next ring.
+## When only a few cities are left, it's faster to just compute the distances
+## to all of them.
+class GridIndex:
+    def __init__(self, x, y, cities = None):
+        self.x, self.y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        if cities is None:
+            cities = np.arange(len(x))
+        cities = np.asarray(cities, dtype=int)
+        self.g = g = max(1, int(np.sqrt(len(cities) / 2)))
+        self.x0, self.y0 = self.x[cities].min(), self.y[cities].min()
+        self.h = max(self.x[cities].max() - self.x0, self.y[cities].max() - self.y0, 1e-300) / g
+        self.cells = [set() for k in range(g*g)]
+        for c in cities.tolist():
+            self.cells[self.cell(c)].add(c)
+        self.left = set(cities.tolist())
+
+    def coords(self, c):
+        cx = min(max(int((self.x[c] - self.x0) / self.h), 0), self.g - 1)
+        cy = min(max(int((self.y[c] - self.y0) / self.h), 0), self.g - 1)
+        return cx, cy
+
+    def cell(self, c):
+        cx, cy = self.coords(c)
+        return cx * self.g + cy
+
+    def remove(self, c):
+        self.cells[self.cell(c)].discard(c)
+        self.left.discard(c)
+
+    def __len__(self):
+        return len(self.left)
+
+    ## The nearest city to `c` still in the grid (`c` itself excluded), or
+    ## None if there are none
+    def nearest(self, c):
+        x, y, g = self.x, self.y, self.g
+        left = [d for d in self.left if d != c] if len(self.left) <= 4 * g else None
+        if left is not None:
+            if not left:
+                return None
+            left = np.array(left)
+            return left[np.argmin((x[left] - x[c])**2 + (y[left] - y[c])**2)]
+        cx, cy = self.coords(c)
+        best, best_d2 = None, np.inf
+        xc, yc = x[c], y[c]
+        for r in range(g):
+            ## The cells of the ring at distance r
+            for i in range(max(cx-r, 0), min(cx+r, g-1) + 1):
+                if abs(i - cx) == r:
+                    js = range(max(cy-r, 0), min(cy+r, g-1) + 1)
+                else:
+                    js = [j for j in (cy-r, cy+r) if 0 <= j < g]
+                for j in js:
+                    for d in self.cells[i*g+j]:
+                        if d == c:
+                            continue
+                        d2 = (x[d] - xc)**2 + (y[d] - yc)**2
+                        if d2 < best_d2:
+                            best, best_d2 = d, d2
+            ## Anything outside of this ring is at least r cells away
+            if best is not None and best_d2 <= (r * self.h)**2:
+                break
+        return best
+
+## The order of the points along a Hilbert curve, a "space-filling curve" which
+## visits all the cells of a 2^order x 2^order grid, moving each time to an
+## adjacent cell. Points which are close on the curve are close in the plane
+## (the converse is not always true), so this gives a reasonable tour in
+## O(n log n) time. The index of each point along the curve is computed bit by
+## bit, with a standard algorithm, for all the points at once.
+def hilbert_order(x, y, order = 16):
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    side = 2**order
+    w = max(x.max() - x.min(), y.max() - y.min(), 1e-300)
+    ix = np.minimum(((x - x.min()) / w * side).astype(np.int64), side - 1)
+    iy = np.minimum(((y - y.min()) / w * side).astype(np.int64), side - 1)
+    d = np.zeros(len(x), dtype=np.int64)
+    s = side // 2
+    while s > 0:
+        rx = (ix & s) > 0
+        ry = (iy & s) > 0
+        d += s * s * ((3 * rx) ^ ry)
+        ## Rotate the quadrant, so that the curve inside it has the right orientation
+        flip = ~ry & rx
+        ix[flip] = side - 1 - ix[flip]
+        iy[flip] = side - 1 - iy[flip]
+        swap = ~ry
+        ix[swap], iy[swap] = iy[swap], ix[swap].copy()
+        s //= 2
+    return np.argsort(d, kind="stable")
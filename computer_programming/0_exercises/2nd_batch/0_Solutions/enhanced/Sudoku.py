@@ -1,5 +1,8 @@
 import numpy as np
-from copy import deepcopy
+from copy import copy
+
+import RandBuffer as RB
+import Presolve
 
 ## This file is derived from "LatinSquare3.py".
 ## The only changes are in the constructor (extra check and extra `sn` attribute),
@@ -8,6 +11,29 @@ from copy import deepcopy
 ## There is also a change in `cost1` because `len(a)` doesn't work if `a` is
 ## a 2d-array (it returns the number of rows), so we need to use the `size`
 ## attribute.
+## The random numbers of the moves proposals are taken from the buffer of
+## "RandBuffer.py". Finally, it implements snapshots and a cheaper `copy`.
+##
+## Computing the delta cost with `cost1` (i.e. `np.unique`) on two rows and two
+## sub-squares, before and after the swap, takes O(n log n) time and creates
+## many temporary arrays at each step. Instead, as in the `CostTracker` of
+## "../verymuchadvanced/LatinSquare3.py", we keep for each row and for each
+## sub-square ("box") a counter of how many times each value appears in it,
+## and a histogram of the counters: `row_count[i,v]` is the number of times
+## that `v` appears in row `i`, and `row_hist[i,c]` is the number of values
+## which appear `c` times in row `i`; same for `box_count` and `box_hist`, with
+## the boxes numbered row by row. All of them are 2-d arrays. The cost of a row
+## (or box) is the number of missing values, i.e. `row_hist[i,0]`.
+## A swap in a column removes a value from a row and adds another one, in two
+## rows (and in two boxes, if the rows are in different boxes), so the delta
+## cost and the updates only look at a few entries of these arrays: O(1) time.
+## The moves are also proposed in O(1) time, using the list of the free rows of
+## each column, computed in advance.
+## With the option `presolve=True`, the entries of a puzzle which are forced by
+## simple logic are filled in and fixed before anything else (see
+## "Presolve.py"), so the annealing only deals with the remaining ones. If
+## none remain, the table is already the solution (with cost 0), and
+## `propose_move` returns a move which does nothing.
 
 ## Auxiliary cost function: returns the number of repeated
 ## elements in the input, which can be computed as the number
@@ -16,17 +42,21 @@ from copy import deepcopy
 def cost1(a):
     return a.size - np.unique(a).size
 
-## An auxiliary function two swap two rows in a given column, ensuring that
-## they are not fixed (note: this could be greatly improved)
-def rand2rows(mask, col, n):
-    while True:
-        i1, i2 = np.random.randint(n), np.random.randint(n)
-        if i1 != i2 and not mask[i1,col] and not mask[i2,col]:
-            break
-    return i1, i2
+## Auxiliary function for the counters: in unit `u` (a row or a box), one
+## occurrence of value `old` is replaced by `new`. Updates the counter and the
+## histogram (see the notes at the top).
+def replace(count, hist, u, old, new):
+    c = count[u,old]
+    hist[u,c] -= 1
+    hist[u,c-1] += 1
+    count[u,old] = c - 1
+    c = count[u,new]
+    hist[u,c] -= 1
+    hist[u,c+1] += 1
+    count[u,new] = c + 1
 
 class Sudoku:
-    def __init__(self, init):
+    def __init__(self, init, presolve = False):
         if not (isinstance(init, int) or isinstance(init, np.ndarray)):
             raise Exception("the first argument must be either an int or a Sudoku")
 
@@ -51,6 +81,8 @@ class Sudoku:
                 raise Exception("the init array must be square")
             if not int(np.sqrt(n))**2 == n:
                 raise Exception("the init size must be an exact square")
+            if presolve:
+                init = Presolve.presolve(init)
             self.n = n
             self.sn = int(np.sqrt(n))
             self.table = init.copy()
@@ -106,11 +138,40 @@ class Sudoku:
                 if sum(mask[:,j]) == n-1:
                     mask[:,j] = True
 
-            ## We new check that there is at least some freedom left
+            ## We new check that there is at least some freedom left (unless
+            ## the presolver has solved the whole puzzle: that's fine, the
+            ## table is the solution and the moves do nothing)
 
-            if mask.sum() == n**2:
+            if not presolve and mask.sum() == n**2:
                 raise Exception("Failed to create a meaningful puzzle; try lowering r")
 
+        self.update_free()
+        self.count()
+
+    ## The free rows of each column, and the columns with at least two free rows
+    ## (where a swap is possible). This must be called whenever the mask changes.
+    def update_free(self):
+        n, mask = self.n, self.mask
+        self.free = [np.flatnonzero(~mask[:,j]) for j in range(n)]
+        self.free_cols = np.array([j for j in range(n) if len(self.free[j]) >= 2], dtype=int)
+
+    ## (Re)compute the counters and the histograms from the table, from scratch
+    def count(self):
+        n, sn, table = self.n, self.sn, self.table
+        rows = np.repeat(np.arange(n), n)
+        ## The box of each entry of the table
+        boxes = (rows // sn) * sn + np.tile(np.arange(n) // sn, n)
+        ## `np.add.at` adds 1 for each pair of indices, counting the
+        ## repetitions (`count[rows, table.ravel()] += 1` would count them once)
+        self.row_count = np.zeros((n,n), dtype=int)
+        np.add.at(self.row_count, (rows, table.ravel()), 1)
+        self.box_count = np.zeros((n,n), dtype=int)
+        np.add.at(self.box_count, (boxes, table.ravel()), 1)
+        self.row_hist = np.zeros((n,n+1), dtype=int)
+        np.add.at(self.row_hist, (rows, self.row_count.ravel()), 1)
+        self.box_hist = np.zeros((n,n+1), dtype=int)
+        np.add.at(self.box_hist, (rows, self.box_count.ravel()), 1)
+
     def init_config(self):
         n, table, mask = self.n, self.table, self.mask
         ## Reshuffle the table, but only the un-masked elements
@@ -120,6 +181,7 @@ class Sudoku:
             v = table[mj,j]
             np.random.shuffle(v)
             table[mj,j] = v
+        self.count()
 
     def __repr__(self):
         ## Improved printing; all this mess is just to add the sub-squares
@@ -166,6 +228,33 @@ class Sudoku:
             s += "\n"
         print("Sudoku puzzle:\n" + s)
 
+    ## Draw the table on the matplotlib axes `ax` (used by "LiveView.py"): the
+    ## fixed entries in black, the others in blue, or in red if they are
+    ## repeated in their row or sub-square (the columns have no repetitions)
+    def draw(self, ax):
+        n, sn, table, mask = self.n, self.sn, self.table, self.mask
+        rep = np.zeros((n,n), dtype=bool)
+        for i in range(n):
+            vals, counts = np.unique(table[i], return_counts=True)
+            rep[i] |= np.isin(table[i], vals[counts > 1])
+        for i in range(0, n, sn):
+            for j in range(0, n, sn):
+                sq = table[i:i+sn, j:j+sn]
+                vals, counts = np.unique(sq, return_counts=True)
+                rep[i:i+sn, j:j+sn] |= np.isin(sq, vals[counts > 1])
+        for i in range(n):
+            for j in range(n):
+                color = "black" if mask[i,j] else "red" if rep[i,j] else "blue"
+                ax.text(j + 0.5, n - i - 0.5, str(table[i,j]), color=color,
+                        ha="center", va="center")
+        ## The grid, with thicker lines around the sub-squares
+        for k in range(n+1):
+            lw = 2 if k % sn == 0 else 0.5
+            ax.plot([0, n], [k, k], c="black", lw=lw)
+            ax.plot([k, k], [0, n], c="black", lw=lw)
+        ax.set_aspect("equal")
+        ax.axis("off")
+
     def gen_puzzle(self, r=0.5):
         ## Generates a puzzle from the current configuration
         ## (Parts of this were taken copy-paster from the `__init__` method
@@ -197,10 +286,16 @@ class Sudoku:
 
         return output
 
+    ## The cost from the histograms, in O(n) time
+    def tracked_cost(self):
+        return self.row_hist[:,0].sum() + self.box_hist[:,0].sum()
+
     def cost(self):
         n, sn = self.n, self.sn
         table = self.table
         ## The cost is just the number repetitions in each row, column and sub-square
+        ## (this is computed from scratch, without the counters; it could also
+        ## be just `self.tracked_cost()`)
         c = 0
         ## This is the same as LatinSquare3
         for row in self.table:
@@ -220,80 +315,96 @@ class Sudoku:
         return c
 
     def propose_move(self):
-        n, mask = self.n, self.mask
         ## Our move consists in picking two entries at random in the same column
         ## and swapping them.
-        ## So we need to choose one column and two rows
-        ## However, the column must have enough freedom: there need to be at least
-        ## two free places to swap. By construction (see `__init__`) we have already
-        ## avoided the case when there is only a single free place. Thus we just
-        ## need to ensure that the count of fixed places is less than `n`.
-        while True:
-            col = np.random.randint(n)
-            if mask[:,col].sum() < n: # Summing an array of bools = count the Trues
-                break
-        r1, r2 = rand2rows(mask, col, n)
+        ## So we need to choose one column and two rows.
+        ## The column must have enough freedom: there need to be at least two
+        ## free places to swap, so we pick it among `free_cols`. Then we pick
+        ## two different free rows of that column (the second one among the
+        ## other k-1, skipping the first).
+        free_cols = self.free_cols
+        ## Nothing left to move (the puzzle was solved by the presolver):
+        ## swapping an entry with itself does nothing
+        if len(free_cols) == 0:
+            return (0, 0, 0)
+        col = free_cols[RB.randint(len(free_cols))]
+        rows = self.free[col]
+        k = len(rows)
+        i1, i2 = RB.randint(k), RB.randint(k-1)
+        if i2 >= i1:
+            i2 += 1
 
         ## Our move will need to encode the two table positions that we swap
-        return (col, r1, r2)
+        return (col, rows[i1], rows[i2])
 
     def compute_delta_cost(self, move):
         col, r1, r2 = move # unpack the move
-        n, sn = self.n, self.sn
-        table = self.table
-
-        ## The first cost contribution of the current configuration comes from
-        ## the two rows involved in the move
-        oldc1 = cost1(table[r1,:])
-        oldc2 = cost1(table[r2,:])
-
-        ## The second constribution costs changes associated to the sub-squares
-        sj = col // sn             # sub-square column index
-        si1 = r1 // sn             # first sub-square row index
-        si2 = r2 // sn             # second sub-square row index
-        i10 = sn * si1             # range start, rows, first sub-sqaure
-        i11 = i10 + sn             # range end, rows, first sub-square
-        i20 = sn * si2             # range start, rows, second sub-square
-        i21 = i20 + sn             # range end, rows, second sub-square
-        j0 = sn * sj               # range start, columns
-        j1 = j0 + sn               # range end, columns
-
-        ## The sub-squares costs only change if the swap involves two different sub-squares
-        if si1 != si2:
-            olds1 = cost1(table[i10:i11, j0:j1])
-            olds2 = cost1(table[i20:i21, j0:j1])
-        else:
-            olds1, olds2 = 0, 0
-
-        oldc = oldc1 + oldc2 + olds1 + olds2
-
-        ## Change the table temporarily
-        table[[r1,r2],col] = table[[r2,r1],col]
-
-        ## Compute the new cost contributions of the rows
-        newc1 = cost1(table[r1,:])
-        newc2 = cost1(table[r2,:])
-
-        ## Compute the new cost contributions of the sub-squares
-        if si1 != si2:
-            news1 = cost1(table[i10:i11, j0:j1])
-            news2 = cost1(table[i20:i21, j0:j1])
-        else:
-            news1, news2 = 0, 0
-
-        newc = newc1 + newc2 + news1 + news2
-
-        ## Cost difference, new - old
-        delta_c = newc - oldc
-
-        ## Restore the table (we haven't accepted the move yet!)
-        table[[r1,r2],col] = table[[r2,r1],col]
+        sn, table = self.sn, self.table
+        row_count, box_count = self.row_count, self.box_count
+
+        ## Read out the two values that we're about to swap
+        v1, v2 = table[r1,col], table[r2,col]
+        if v1 == v2:
+            return 0
+
+        ## In row `r1`, v1 is replaced by v2: if v1 was there only once it
+        ## becomes missing (+1), if v2 was missing it's not any more (-1).
+        ## And vice versa in row `r2`.
+        delta_c = int(row_count[r1,v1] == 1) - int(row_count[r1,v2] == 0) + \
+                  int(row_count[r2,v2] == 1) - int(row_count[r2,v1] == 0)
+
+        ## The same for the boxes, if they are different
+        b1 = (r1 // sn) * sn + col // sn
+        b2 = (r2 // sn) * sn + col // sn
+        if b1 != b2:
+            delta_c += int(box_count[b1,v1] == 1) - int(box_count[b1,v2] == 0) + \
+                       int(box_count[b2,v2] == 1) - int(box_count[b2,v1] == 0)
 
         return delta_c
 
     def accept_move(self, move):
         col, r1, r2 = move # unpack the move
-        self.table[[r1,r2],col] = self.table[[r2,r1],col]
-
+        sn, table = self.sn, self.table
+        v1, v2 = table[r1,col], table[r2,col]
+        table[r1,col], table[r2,col] = v2, v1
+        if v1 == v2:
+            return
+        ## Update the counters and the histograms
+        replace(self.row_count, self.row_hist, r1, v1, v2)
+        replace(self.row_count, self.row_hist, r2, v2, v1)
+        b1 = (r1 // sn) * sn + col // sn
+        b2 = (r2 // sn) * sn + col // sn
+        if b1 != b2:
+            replace(self.box_count, self.box_hist, b1, v1, v2)
+            replace(self.box_count, self.box_hist, b2, v2, v1)
+
+    ## Snapshots: the configuration alone (the table), without the mask.
+    ## If `buf` is given, the table is copied into it.
+    def snapshot(self, buf=None):
+        if buf is None:
+            return self.table.copy()
+        buf[:] = self.table
+        return buf
+
+    def restore(self, buf):
+        self.table[:] = buf
+        self.count()
+
+    ## Serialization, for the checkpoints of `simann` (a dict of arrays)
+    def serialize(self):
+        return dict(table=self.snapshot())
+
+    def deserialize(self, data):
+        table = data["table"]
+        if table.shape != self.table.shape:
+            raise Exception("the table in the data doesn't match the instance")
+        self.restore(table)
+
+    ## The mask never changes after the construction, it can be shared among
+    ## the copies
     def copy(self):
-        return deepcopy(self)
+        other = copy(self)
+        other.table = self.table.copy()
+        for attr in ("row_count", "row_hist", "box_count", "box_hist"):
+            setattr(other, attr, getattr(self, attr).copy())
+        return other
@@ -0,0 +1,500 @@
+import numpy as np
+import matplotlib.pyplot as plt
+
+from copy import copy
+from collections import deque
+
+import RandBuffer as RB
+import Spatial
+import Construct
+from Tour import TwoLevelTour
+
+## This file is the same as "../TSP.py", except that the random numbers of
+## the moves proposals are taken from the buffer of "RandBuffer.py", and that
+## it implements snapshots and a cheaper `copy` method.
+##
+## For large instances, there is also the option `neighbours=k`: the k nearest
+## neighbours of each city are computed in advance (see "Spatial.py") and the
+## moves are proposed only among those which create an edge between a city and
+## one of its neighbours. With uniformly random moves, for large n almost all
+## proposals join two far-apart cities and are rejected; good tours only use
+## short edges anyway. To find the move which creates a given edge we need to
+## know the position of each city in the route, so in this mode we also keep
+## the inverse permutation `pos` (`route[pos[c]] == c`) up to date.
+## NOTE: these proposals are not symmetric (the move that undoes a move is in
+## general proposed with a different probability), so strictly speaking the
+## MCMC does not sample the Boltzmann distribution any more. For optimization
+## purposes this is not a problem in practice.
+##
+## The option `distances` chooses how the distances are stored:
+##  * "float64": a full n x n matrix (the default, as in "../TSP.py")
+##  * "float32": a full matrix in single precision, half the memory
+##  * "implicit": no matrix at all, the distances are computed from the
+##    coordinates when needed (see `ImplicitDistances` in "Spatial.py"). The
+##    memory is O(n), so this works for 10^5 cities and more.
+## In all cases `self.dist[i,j]` gives the distance between cities i and j (and
+## `self.dist[cities1,cities2]` works with arrays), so the rest of the code
+## doesn't need to know. With the neighbour lists, the distances from each city
+## to its neighbours are also kept in `self.neigh_dist` (an n x k array), for
+## `polish`. The annealing doesn't use them: looking a distance up in a cache
+## is hardly faster than computing it from the coordinates in Python, and the
+## cost of the misses cancels the gain.
+## (In single precision, `debug_hook` may fail because of rounding errors.)
+##
+## The option `init` chooses the initial tour of `init_config`:
+##  * "random": a random permutation (the default, as in "../TSP.py")
+##  * "nn": nearest neighbour, from a random starting city
+##  * "greedy": greedy edge matching
+##  * "hilbert": the order of the cities along a Hilbert curve
+## (see "Construct.py"). The constructed tours are typically 15-40% above the
+## optimum, much better than a random one, so the annealing can start at a
+## larger beta. The last two don't depend on the random numbers, so they are
+## computed only once.
+##
+## Instead of random cities, the instance can be given explicitly: `coords`
+## is an n x 2 array with the coordinates of the cities, and `matrix` an n x n
+## matrix of distances, which are then used instead of the Euclidean ones (and
+## for the neighbour lists). With a matrix and no coordinates the tour can't be
+## displayed or constructed (only `init="random"` works). This is how the
+## instances of TSPLIB are built, see "TSPLIB.py".
+
+class TSP:
+    def __init__(self, n, seed = None, neighbours = None, distances = "float64", init = "random",
+                 coords = None, matrix = None):
+        if not (isinstance(n, int) and n >= 4):
+            raise Exception("n must be an int greater than 3")
+        if distances not in ("float64", "float32", "implicit"):
+            raise Exception("distances must be 'float64', 'float32' or 'implicit'")
+        if init not in ("random", "nn", "greedy", "hilbert"):
+            raise Exception("init must be 'random', 'nn', 'greedy' or 'hilbert'")
+        if coords is not None and np.shape(coords) != (n, 2):
+            raise Exception("coords must be an n x 2 array")
+        if matrix is not None:
+            if np.shape(matrix) != (n, n):
+                raise Exception("matrix must be an n x n array")
+            if distances == "implicit":
+                raise Exception("the distances can't be implicit when a matrix is given")
+            if coords is None and init != "random":
+                raise Exception("init must be 'random' when there are no coordinates")
+        self.n = n
+        self.init = init
+        self.init_route = None # cache for the deterministic constructions
+
+        ## Optionally set up the random number generator state
+        if seed is not None:
+            RB.seed(seed)
+
+        ## Random coordinates in [0,1)x[0,1), unless given
+        if coords is not None:
+            coords = np.asarray(coords, dtype=float)
+            x, y = coords[:,0].copy(), coords[:,1].copy()
+        elif matrix is not None:
+            x, y = None, None
+        else:
+            x = np.random.rand(n)
+            y = np.random.rand(n)
+        self.x, self.y = x, y
+
+        ## Pre-compute the distances (or not)
+        self.matrix_given = matrix is not None
+        if matrix is not None:
+            self.dist = np.asarray(matrix, dtype=distances)
+        elif distances == "implicit":
+            self.dist = Spatial.ImplicitDistances(x, y)
+        else:
+            self.dist = Spatial.dense_distances(x, y, dtype=distances)
+
+        ## The neighbour lists (None means: uniform proposals)
+        if neighbours is not None:
+            self.neigh, self.neigh_dist = self.nearest_neighbours(neighbours)
+            self.pos = np.zeros(n, dtype=int)
+        else:
+            self.neigh, self.neigh_dist = None, None
+
+        ## Allocate the memory for the route, then initialize it
+        self.route = np.zeros(n, dtype=int)
+        self.init_config()
+
+    ## Initialize (or reset) the current configuration
+    def init_config(self):
+        n, x, y = self.n, self.x, self.y
+        ## Remember the `[:]` for in-place assignment!
+        if self.init == "random":
+            self.route[:] = np.random.permutation(n)
+        elif self.init == "nn":
+            self.route[:] = Construct.nearest_neighbour_tour(x, y, start=RB.randint(n))
+        else:
+            if self.init_route is None:
+                if self.init == "greedy":
+                    self.init_route = Construct.greedy_edge_tour(x, y)
+                else:
+                    self.init_route = Construct.hilbert_tour(x, y)
+            self.route[:] = self.init_route
+        self.update_pos()
+
+    ## Recompute the inverse permutation of the route (if we need it)
+    def update_pos(self):
+        if self.neigh is not None:
+            self.pos[self.route] = np.arange(self.n)
+
+    ## The `k` nearest neighbours of each city and their distances (n x k
+    ## arrays), from the coordinates or from the matrix of the distances
+    def nearest_neighbours(self, k):
+        if self.matrix_given:
+            return Spatial.knn_matrix(self.dist, k, return_dist=True)
+        return Spatial.knn(self.x, self.y, k, return_dist=True)
+
+    ## Plot the cities and the current configuration
+    def display(self):
+        plt.clf()
+        self.draw(plt.gca())
+        ## Pause to actually see something
+        plt.pause(0.00001)
+
+    ## Draw the cities and the current configuration on the matplotlib axes
+    ## `ax` (this is also used by "LiveView.py")
+    def draw(self, ax):
+        x, y = self.x, self.y
+        if x is None:
+            raise Exception("the instance has no coordinates, it can't be displayed")
+        route = self.route
+        ## Cities locations
+        ax.plot(x, y, 'o')
+        ## Route (the last city is repeated at the end to close the tour)
+        closed = np.append(route, route[0])
+        ax.plot(x[closed], y[closed], '-', c='orange')
+
+    ## Cost of the current configuration, computed from scratch.
+    ## `np.roll(route, -1)` is the route shifted by one position (the first city
+    ## goes to the end), so `route[e]` and `np.roll(route, -1)[e]` are the two
+    ## endpoints of edge `e`: all the edges are looked up at once in the matrix
+    ## (or computed at once, with the implicit distances). The sum is always
+    ## done in double precision.
+    def cost(self):
+        route, dist = self.route, self.dist
+        return dist[route, np.roll(route, -1)].sum(dtype=float)
+
+    ## The costs of many routes at once, given as a 2-d array with one route per
+    ## row (e.g. to rank the results of many runs). The configuration is not
+    ## used. For large n, pass the routes in blocks: a temporary array of the
+    ## size of `routes` is created.
+    def costs(self, routes):
+        routes = np.asarray(routes)
+        return self.dist[routes, np.roll(routes, -1, axis=1)].sum(axis=1, dtype=float)
+
+    ## Propose a valid random move. Returns two edge indices to cross.
+    def propose_move(self):
+        n = self.n
+        if self.neigh is not None:
+            return self.propose_neighbour_move()
+        while True:
+            e1 = RB.randint(n)
+            e2 = RB.randint(n)
+            if e1 > e2:
+                e1, e2 = e2, e1
+            if e1 != e2 and e1 + 1 != e2 and not (e1 == 0 and e2 == n-1):
+                break
+        move = (e1, e2)
+        return move
+
+    ## Propose a move which creates an edge between a random city `a` and one
+    ## of its neighbours `b`. Crossing the edges that start at positions
+    ## e1 = pos[a] and e2 = pos[b] creates the edge (a,b); crossing the edges
+    ## that end there (e1 = pos[a]-1, e2 = pos[b]-1) too. We pick one of the
+    ## two at random.
+    def propose_neighbour_move(self):
+        n, neigh, pos = self.n, self.neigh, self.pos
+        kn = neigh.shape[1]
+        while True:
+            a = RB.randint(n)
+            b = neigh[a, RB.randint(kn)]
+            shift = RB.randint(2)
+            e1, e2 = (pos[a] - shift) % n, (pos[b] - shift) % n
+            if e1 > e2:
+                e1, e2 = e2, e1
+            if e1 + 1 < e2 and not (e1 == 0 and e2 == n-1):
+                return (e1, e2)
+
+    ## Propose `k` valid random moves at once, as a k x 2 array of edge
+    ## indices (each row is a move like those returned by `propose_move`).
+    ## We draw more pairs than needed and discard the invalid ones.
+    def propose_moves(self, k):
+        n = self.n
+        moves = np.zeros((0,2), dtype=int)
+        while len(moves) < k:
+            if self.neigh is not None:
+                ## Same as `propose_neighbour_move`, vectorized
+                a = np.random.randint(n, size=2*k)
+                b = self.neigh[a, np.random.randint(self.neigh.shape[1], size=2*k)]
+                shift = np.random.randint(2, size=2*k)
+                e = np.stack(((self.pos[a] - shift) % n, (self.pos[b] - shift) % n), axis=1)
+                e = np.sort(e, axis=1)
+            else:
+                e = np.sort(np.random.randint(n, size=(2*k,2)), axis=1)
+            e1, e2 = e[:,0], e[:,1]
+            valid = (e1 + 1 < e2) & ~((e1 == 0) & (e2 == n-1))
+            moves = np.concatenate((moves, e[valid]))
+        return moves[:k]
+
+    ## All the valid moves, as an array with one (e1, e2) pair per row. They
+    ## don't depend on the configuration, so they are computed only once.
+    def all_moves(self):
+        if getattr(self, "moves", None) is None:
+            n = self.n
+            e1, e2 = np.triu_indices(n, 2) # all the pairs with e1 + 1 < e2
+            valid = ~((e1 == 0) & (e2 == n-1))
+            self.moves = np.stack((e1[valid], e2[valid]), axis=1)
+        return self.moves
+
+    ## Modify the current configuration, accepting the proposed move
+    def accept_move(self, move):
+        ## Accepting a move is much easier (and computationally cheaper) in
+        ## this case, compared to the swap paths version
+        e1, e2 = move
+        route = self.route
+        route[e1+1:e2+1] = route[e2:e1:-1]
+        if self.neigh is not None:
+            self.pos[route[e1+1:e2+1]] = np.arange(e1+1, e2+1)
+
+    ## Compute the extra cost of the move (new-old, negative means convenient)
+    def compute_delta_cost(self, move):
+        e1, e2 = move
+        n, route, dist = self.n, self.route, self.dist
+        ## Cities involved in the first (old) edge
+        city11, city12 = route[e1], route[(e1+1) % n]
+        ## Cities involved in the second (old) edge
+        city21, city22 = route[e2], route[(e2+1) % n]
+        ## Costs of the old edges
+        d1_old = dist[city11, city12]
+        d2_old = dist[city21, city22]
+        c_old = d1_old + d2_old
+        ## Costs of the new edges
+        d1_new = dist[city11, city21]
+        d2_new = dist[city12, city22]
+        c_new = d1_new + d2_new
+        ## Cost difference
+        delta_c = c_new - c_old
+        return delta_c
+
+    ## Same as `compute_delta_cost`, but for many moves at once (`moves` is
+    ## an array like the one returned by `propose_moves`). Returns an array
+    ## with the delta cost of each move, each computed with respect to the
+    ## current configuration. The computation is exactly the same, but done
+    ## with fancy indexing on whole arrays of edges.
+    def compute_delta_cost_batch(self, moves):
+        n, route, dist = self.n, self.route, self.dist
+        e1, e2 = moves[:,0], moves[:,1]
+        city11, city12 = route[e1], route[(e1+1) % n]
+        city21, city22 = route[e2], route[(e2+1) % n]
+        c_old = dist[city11, city12] + dist[city21, city22]
+        c_new = dist[city11, city21] + dist[city12, city22]
+        return c_new - c_old
+
+    ## A deterministic 2-opt local search, to polish a tour (e.g. the one
+    ## returned by `simann`): it applies improving 2-opt moves until there are
+    ## none left. Returns the total change of the cost (negative or zero).
+    ## Instead of scanning all the O(n^2) moves at each step, it uses two
+    ## standard tricks:
+    ##  * Neighbour lists: an improving move must create an edge (a,b) shorter
+    ##    than one of the edges that it removes, say the one between a and its
+    ##    successor (or predecessor). So for each city a we only try the
+    ##    nearest neighbours b, in order of distance, and we stop as soon as
+    ##    d(a,b) is longer than the edge of a. The lists are those of the
+    ##    `neighbours` option, or `k` nearest neighbours otherwise. The
+    ##    distances d(a,b) are read from `self.dist`, like all the others: with
+    ##    single precision, comparing them with the double precision distances
+    ##    of the lists would give spurious improvements of about 1e-7.
+    ##  * "Don't-look bits": the cities to examine are kept in a queue. Once a
+    ##    city has been examined without finding anything, it's not examined
+    ##    again unless one of its edges changes (then it goes back in the
+    ##    queue, together with the other endpoints of the changed edges).
+    ## So after the first pass, the work is proportional to the number of
+    ## improvements, and the whole thing takes close to linear time.
+    ## When a move is applied, we reverse the shorter of the two sides of
+    ## the tour (which gives the same tour).
+    def polish(self, k = 8):
+        n, route, dist = self.n, self.route, self.dist
+        if self.neigh is not None:
+            neigh = self.neigh
+        else:
+            neigh, neigh_dist = self.nearest_neighbours(min(k, n-1))
+        neigh_dist = dist[np.arange(n)[:,None], neigh]
+        neigh, neigh_dist = neigh.tolist(), neigh_dist.tolist()
+        pos = np.zeros(n, dtype=int)
+        pos[route] = np.arange(n)
+
+        queue = deque(range(n))
+        inqueue = [True] * n
+        gain = 0.0
+        while queue:
+            a = queue.popleft()
+            inqueue[a] = False
+            ## Try both directions: `shift=0` removes the edges that go from
+            ## a and b to their successors, `shift=1` those that go from their
+            ## predecessors to a and b
+            for shift in (0, 1):
+                i = pos[a]
+                a2 = route[(i + 1) % n] if shift == 0 else route[i - 1]
+                d_a = dist[a, a2]
+                found = False
+                for b, d_ab in zip(neigh[a], neigh_dist[a]):
+                    if d_ab >= d_a:
+                        break
+                    j = pos[b]
+                    b2 = route[(j + 1) % n] if shift == 0 else route[j - 1]
+                    ## The move: (e1, e2) as in `accept_move`; if b is next
+                    ## to a, it's not a valid move, try the next neighbour
+                    e1, e2 = (i - shift) % n, (j - shift) % n
+                    if e1 > e2:
+                        e1, e2 = e2, e1
+                    if not (e1 + 1 < e2 and not (e1 == 0 and e2 == n-1)):
+                        continue
+                    delta = d_ab + dist[a2, b2] - d_a - dist[b, b2]
+                    if delta < -1e-12:
+                        found = True
+                        break
+                if not found:
+                    continue
+                if 2 * (e2 - e1) <= n:
+                    seg = np.arange(e1 + 1, e2 + 1)
+                else:
+                    seg = np.arange(e2 + 1, e1 + n + 1) % n
+                route[seg] = route[seg[::-1]]
+                pos[route[seg]] = seg
+                gain += delta
+                for c in (a, a2, b, b2):
+                    if not inqueue[c]:
+                        queue.append(c)
+                        inqueue[c] = True
+                break
+        self.update_pos()
+        return gain
+
+    ## Snapshots: the configuration alone (the route), without the instance
+    ## data (the coordinates and the distances). If `buf` is given, the route
+    ## is copied into it, without allocating anything.
+    def snapshot(self, buf=None):
+        if buf is None:
+            return self.route.copy()
+        buf[:] = self.route
+        return buf
+
+    ## Set the configuration from a snapshot
+    def restore(self, buf):
+        self.route[:] = buf
+        self.update_pos()
+
+    ## Serialization, for the checkpoints of `simann` (a dict of arrays)
+    def serialize(self):
+        return dict(route=self.snapshot())
+
+    def deserialize(self, data):
+        route = data["route"]
+        if route.shape != self.route.shape:
+            raise Exception("the route in the data doesn't match the instance")
+        self.restore(route)
+
+    ## Make an independent duplicate of the current object.
+    ## The coordinates and the distances never change, so they can be shared
+    ## among the copies; only the route needs to be duplicated. This is much
+    ## faster than a `deepcopy` and saves a lot of memory for large `n`.
+    def copy(self):
+        other = copy(self) # "shallow" copy, all attributes are shared
+        other.route = self.route.copy()
+        if self.neigh is not None:
+            other.pos = self.pos.copy()
+        return other
+
+## A variant of `TSP` where the tour is stored in a `TwoLevelTour` (see
+## "Tour.py"), so that accepting a move takes O(sqrt(n)) time instead of O(n).
+## The array reversal of `TSP` is a single (very fast) numpy call, though, so
+## this only pays off for very large n: it's about as fast at 2*10^5 cities, and
+## about 5 times faster at 10^6 cities.
+## Since the tour doesn't have fixed positions any more, the moves are given by
+## cities instead of edge indices: the move `(a, b)` replaces the edges
+## (a, next(a)) and (b, next(b)) with (a, b) and (next(a), next(b)). (The move
+## that undoes it is `(a, next(a))`, proposed with the same probability, so the
+## proposals are still symmetric, unless the neighbour lists are used.)
+## The `route` array is only brought up to date when it's needed (for the cost,
+## the snapshots, the display...), so everything else works as in `TSP`.
+## The batched moves are not supported (the solvers which can do without them,
+## like `tabu`, fall back to single moves; the others refuse to start).
+class TSP_2L(TSP):
+    def init_config(self):
+        super().init_config()
+        self.tour = TwoLevelTour(self.route)
+        self.synced = True
+
+    ## Copy the tour into `route`, if needed
+    def sync(self):
+        if not self.synced:
+            self.route[:] = self.tour.to_route()
+            self.synced = True
+
+    def propose_move(self):
+        n, tour = self.n, self.tour
+        while True:
+            a = RB.randint(n)
+            if self.neigh is not None:
+                b = self.neigh[a, RB.randint(self.neigh.shape[1])]
+            else:
+                b = RB.randint(n)
+            if a != b and tour.next(a) != b and tour.next(b) != a:
+                return (a, b)
+
+    def compute_delta_cost(self, move):
+        a, b = move
+        tour, dist = self.tour, self.dist
+        an, bn = tour.next(a), tour.next(b)
+        c_old = dist[a, an] + dist[b, bn]
+        c_new = dist[a, b] + dist[an, bn]
+        return c_new - c_old
+
+    def accept_move(self, move):
+        a, b = move
+        self.tour.two_opt(a, b)
+        self.synced = False
+
+    ## The batched methods inherited from `TSP` work on edge indices, so they
+    ## are hidden: the solvers check for them with `hasattr`, which is False
+    ## when the attribute raises an AttributeError.
+    @property
+    def propose_moves(self):
+        raise AttributeError("TSP_2L doesn't support batched moves")
+
+    @property
+    def compute_delta_cost_batch(self):
+        raise AttributeError("TSP_2L doesn't support batched moves")
+
+    @property
+    def all_moves(self):
+        raise AttributeError("TSP_2L doesn't support batched moves")
+
+    def cost(self):
+        self.sync()
+        return super().cost()
+
+    def draw(self, ax):
+        self.sync()
+        super().draw(ax)
+
+    def snapshot(self, buf=None):
+        self.sync()
+        return super().snapshot(buf)
+
+    def restore(self, buf):
+        super().restore(buf)
+        self.tour = TwoLevelTour(self.route)
+        self.synced = True
+
+    def polish(self, k = 8):
+        self.sync()
+        gain = super().polish(k)
+        self.tour = TwoLevelTour(self.route)
+        return gain
+
+    def copy(self):
+        self.sync()
+        other = super().copy()
+        other.tour = self.tour.copy()
+        return other
@@ -0,0 +1,216 @@
+import numpy as np
+
+from TSP import TSP
+
+### TSPLIB INSTANCES ###
+
+## TSPLIB (http://comopt.ifi.uni-heidelberg.de/software/TSPLIB95/) is the
+## standard library of TSP instances, most of them with a known optimal tour.
+## Solving them is the way to know how good a solver really is, since with
+## random cities we don't know the optimum.
+##
+## The files are plain text: first a "specification" part, with lines like
+## `NAME : burma14` or `DIMENSION : 14`, then one or more "data sections",
+## each starting with a line like `NODE_COORD_SECTION` and followed by numbers,
+## and finally a line `EOF`. The distances are either computed from the
+## coordinates of the cities, with one of several formulas (the
+## `EDGE_WEIGHT_TYPE`, see `distance_matrix`), or given explicitly as a
+## (possibly triangular) matrix. Note that the distances of TSPLIB are always
+## rounded to integers, so the optimal costs are integers too.
+## A ".opt.tour" file has the same structure, with a TOUR_SECTION listing the
+## cities of the optimal tour (numbered from 1), terminated by -1.
+##
+## The files are read one line at a time, and the numbers are put directly
+## into preallocated arrays, so the whole file is never in memory as text.
+## The directory "tsplib" contains a few small instances, with their optimal
+## tours: "burma14" and "ulysses16" are from TSPLIB (their optima, 3323 and
+## 6859, have been verified with an exact Held-Karp solver), the "rnd*" ones
+## are random instances generated to test the other formats, solved the same
+## way.
+
+## How many numbers there are in the EDGE_WEIGHT_SECTION, for each format
+## (for the "COL" formats, the same numbers of the corresponding "ROW" format
+## of the transposed matrix)
+def weights_count(fmt, n):
+    if fmt == "FULL_MATRIX":
+        return n * n
+    if fmt in ("UPPER_ROW", "LOWER_ROW", "UPPER_COL", "LOWER_COL"):
+        return n * (n - 1) // 2
+    if fmt in ("UPPER_DIAG_ROW", "LOWER_DIAG_ROW", "UPPER_DIAG_COL", "LOWER_DIAG_COL"):
+        return n * (n + 1) // 2
+    raise Exception(f"unsupported EDGE_WEIGHT_FORMAT: {fmt}")
+
+## Read `count` numbers from the next lines of the file, however they are
+## split among the lines
+def read_numbers(lines, count, dtype = float):
+    data = np.zeros(count, dtype=dtype)
+    i = 0
+    while i < count:
+        line = next(lines, None)
+        if line is None:
+            raise Exception("unexpected end of file")
+        values = line.split()
+        if i + len(values) > count:
+            raise Exception("too many numbers in a data section")
+        data[i:i+len(values)] = values
+        i += len(values)
+    return data
+
+## Read a NODE_COORD_SECTION or a DISPLAY_DATA_SECTION: one line per city, with
+## the number of the city and its coordinates
+def read_coords(lines, n):
+    data = read_numbers(lines, 3 * n).reshape(n, 3)
+    coords = np.zeros((n, 2))
+    coords[data[:,0].astype(int) - 1] = data[:,1:]
+    return coords
+
+## Rebuild the full (symmetric) matrix from the numbers of the
+## EDGE_WEIGHT_SECTION. For a symmetric matrix, reading the upper triangle by
+## columns is the same as reading the lower triangle by rows, and so on.
+def weights_matrix(fmt, w, n):
+    if fmt == "FULL_MATRIX":
+        return w.reshape(n, n)
+    rows, cols = {"UPPER_ROW":      np.triu_indices(n, 1),
+                  "LOWER_COL":      np.triu_indices(n, 1),
+                  "UPPER_DIAG_ROW": np.triu_indices(n),
+                  "LOWER_DIAG_COL": np.triu_indices(n),
+                  "LOWER_ROW":      np.tril_indices(n, -1),
+                  "UPPER_COL":      np.tril_indices(n, -1),
+                  "LOWER_DIAG_ROW": np.tril_indices(n),
+                  "UPPER_DIAG_COL": np.tril_indices(n)}[fmt]
+    matrix = np.zeros((n, n), dtype=w.dtype)
+    matrix[rows, cols] = w
+    matrix[cols, rows] = w
+    return matrix
+
+## Read a ".tsp" or ".opt.tour" file. Returns a dict with the entries of the
+## specification (as strings) and the data that was found in the file:
+## "coords" (n x 2), "display" (n x 2), "weights" (n x n, for the explicit
+## instances) and "tour" (the cities numbered from 0).
+def read(filename):
+    spec = {}
+    with open(filename) as f:
+        lines = iter(f)
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            if line == "EOF":
+                break
+            key = line.split(":")[0].strip()
+            if not key.endswith("_SECTION"):
+                if ":" not in line:
+                    raise Exception(f"invalid line in {filename}: {line}")
+                spec[key] = line.split(":", 1)[1].strip()
+                continue
+            if "DIMENSION" not in spec:
+                raise Exception(f"{key} found before the DIMENSION in {filename}")
+            n = int(spec["DIMENSION"])
+            if key == "NODE_COORD_SECTION":
+                spec["coords"] = read_coords(lines, n)
+            elif key == "DISPLAY_DATA_SECTION":
+                spec["display"] = read_coords(lines, n)
+            elif key == "EDGE_WEIGHT_SECTION":
+                fmt = spec.get("EDGE_WEIGHT_FORMAT", "FULL_MATRIX")
+                w = read_numbers(lines, weights_count(fmt, n))
+                spec["weights"] = weights_matrix(fmt, w, n)
+            elif key == "TOUR_SECTION":
+                ## The tour may be split among the lines in any way
+                tour = []
+                while not tour or tour[-1] != -1:
+                    line = next(lines, None)
+                    if line is None:
+                        raise Exception("unexpected end of file")
+                    tour += [int(v) for v in line.split()]
+                if len(tour) != n + 1:
+                    raise Exception(f"the tour in {filename} doesn't have {n} cities")
+                spec["tour"] = np.array(tour[:-1]) - 1
+            else:
+                raise Exception(f"unsupported section in {filename}: {key}")
+    return spec
+
+## The (rounded) distances between the cities `i` (an array) and all the
+## cities, with the formulas of TSPLIB for each EDGE_WEIGHT_TYPE. The rounding
+## `nint` is done as `int(x + 0.5)`, as in the reference implementation.
+def distances(kind, coords, i):
+    x, y = coords[:,0], coords[:,1]
+    if kind in ("EUC_2D", "CEIL_2D", "ATT"):
+        dx, dy = x[i,None] - x, y[i,None] - y
+        if kind == "EUC_2D":
+            return np.floor(np.sqrt(dx**2 + dy**2) + 0.5)
+        if kind == "CEIL_2D":
+            return np.ceil(np.sqrt(dx**2 + dy**2))
+        ## Pseudo-Euclidean distance, used by the "att" instances
+        r = np.sqrt((dx**2 + dy**2) / 10.0)
+        t = np.floor(r + 0.5)
+        return np.where(t < r, t + 1, t)
+    if kind == "GEO":
+        ## Geographical distance (in km, on an idealized Earth). The
+        ## coordinates are latitude and longitude, in the DDD.MM format
+        ## (degrees and minutes). The value of pi is the one of the reference
+        ## implementation: with `np.pi` a few distances would be rounded
+        ## differently.
+        deg = np.trunc(coords)
+        rad = 3.141592 * (deg + 5.0 * (coords - deg) / 3.0) / 180.0
+        lat, lon = rad[:,0], rad[:,1]
+        q1 = np.cos(lon[i,None] - lon)
+        q2 = np.cos(lat[i,None] - lat)
+        q3 = np.cos(lat[i,None] + lat)
+        d = np.floor(6378.388 * np.arccos(np.clip(0.5 * ((1 + q1) * q2 - (1 - q1) * q3), -1, 1)) + 1.0)
+        d[np.arange(len(d)), i] = 0 # the formula gives 1 on the diagonal
+        return d
+    raise Exception(f"unsupported EDGE_WEIGHT_TYPE: {kind}")
+
+## The full matrix of the distances, computed a block of rows at a time (as
+## `dense_distances` in "Spatial.py")
+def distance_matrix(kind, coords):
+    n = len(coords)
+    dist = np.zeros((n, n))
+    block = max(1, 2**22 // n)
+    for i in range(0, n, block):
+        dist[i:i+block] = distances(kind, coords, np.arange(i, min(i + block, n)))
+    return dist
+
+## Build a `TSP` instance from a ".tsp" file. The other arguments are passed to
+## `TSP` (e.g. `neighbours`, `init`). The matrix of the distances is always
+## computed, except for EUC_2D with `distances="implicit"`: then the distances
+## are computed from the coordinates as usual, without rounding (so the costs
+## are slightly different from the official ones), and large instances can be
+## loaded.
+def load(filename, **kwargs):
+    spec = read(filename)
+    if not spec.get("TYPE", "TSP").startswith("TSP"):
+        raise Exception(f"{filename} is not a symmetric TSP instance")
+    n = int(spec["DIMENSION"])
+    kind = spec.get("EDGE_WEIGHT_TYPE", "EXPLICIT")
+    coords = spec.get("coords", spec.get("display"))
+    if kind == "EXPLICIT":
+        if "weights" not in spec:
+            raise Exception(f"no EDGE_WEIGHT_SECTION in {filename}")
+        matrix = spec["weights"]
+    elif kwargs.get("distances") == "implicit":
+        if kind != "EUC_2D":
+            raise Exception("implicit distances are only supported for EUC_2D instances")
+        matrix = None
+    else:
+        if "coords" not in spec:
+            raise Exception(f"no NODE_COORD_SECTION in {filename}")
+        matrix = distance_matrix(kind, spec["coords"])
+    return TSP(n, coords=coords, matrix=matrix, **kwargs)
+
+## Read the tour of a ".opt.tour" (or ".tour") file, as a route (the cities
+## numbered from 0)
+def read_tour(filename):
+    spec = read(filename)
+    if "tour" not in spec:
+        raise Exception(f"no TOUR_SECTION in {filename}")
+    return spec["tour"]
+
+## The cost of a route for the instance `probl` (without changing its
+## configuration)
+def tour_cost(probl, route):
+    if sorted(route.tolist()) != list(range(probl.n)):
+        raise Exception("the route is not a permutation of the cities")
+    other = probl.copy()
+    other.restore(route)
+    return other.cost()
@@ -0,0 +1,149 @@
+import numpy as np
+from collections import deque
+
+import RandBuffer as RB
+from SimAnn import BestTracker
+
+### TABU SEARCH ###
+
+## Like `greedy`, tabu search always moves "downhill" as long as it can; the
+## difference is in what happens at a local minimum. At each step we look at
+## a set of candidate moves (`candidates` random proposals, or all the moves
+## if the problem can enumerate them) and we take the best one, EVEN IF it
+## increases the cost. To avoid going straight back to where we came from,
+## the moves we make are declared "tabu" for the next `tenure` steps, and the
+## tabu moves are not considered. The only exception is when a tabu move
+## would lead to a configuration better than the best seen so far (this is
+## called the "aspiration" criterion).
+##
+## What exactly is tabu is decided by the `key` function: the tabu list
+## contains `key(move)` for the recent moves, and a candidate `move` is tabu if
+## `key(move)` is in the list. By default the key is the move itself. This
+## works well when a move undoes itself and has a single encoding, like a flip
+## in MaxCut or a 2-opt move in TSP (where e1 < e2); in other cases, a custom key
+## should be passed:
+##  * for Sudoku and LatinSquare, the swap `(col, r1, r2)` is the same as
+##    `(col, r2, r1)`: `key=swap_key` gives them the same key;
+##  * for MagicSquare, `key=lambda move: move[:2]` makes tabu the entries of
+##    the table that were changed recently.
+## The keys are kept in a set (well, a dict, since we need to count the
+## duplicates) so checking if a move is tabu takes O(1) time, and in a queue,
+## to know when they expire.
+##
+## The `probl` object must implement the same methods required by `simann`.
+## If it implements `propose_moves` and `compute_delta_cost_batch` the
+## candidates are evaluated all at once, and if it implements `all_moves` and
+## `candidates` is None the whole neighbourhood is evaluated at each step.
+
+## The default key: the move itself, converted to something hashable (the moves
+## coming from `propose_moves` are lists or numpy scalars)
+def default_key(move):
+    if isinstance(move, (list, tuple, np.ndarray)):
+        return tuple(np.asarray(move).tolist())
+    return np.asarray(move).item()
+
+## The key for the swaps `(col, r1, r2)` of Sudoku and LatinSquare: the two
+## rows are sorted, so that a swap and its reverse have the same key
+def swap_key(move):
+    col, r1, r2 = default_key(move)
+    return (col, min(r1, r2), max(r1, r2))
+
+## The recently made moves (their keys, actually)
+class TabuList:
+    def __init__(self, tenure):
+        if not isinstance(tenure, int) or tenure < 0:
+            raise Exception("tenure must be a non-negative integer")
+        self.tenure = tenure
+        self.queue = deque()
+        self.count = {}
+
+    def __contains__(self, k):
+        return k in self.count
+
+    def add(self, k):
+        if self.tenure == 0:
+            return
+        self.queue.append(k)
+        self.count[k] = self.count.get(k, 0) + 1
+        if len(self.queue) > self.tenure:
+            old = self.queue.popleft()
+            self.count[old] -= 1
+            if self.count[old] == 0:
+                del self.count[old]
+
+## The tabu search generic solver.
+##   num_iters:  number of steps (each step evaluates all the candidates)
+##   candidates: number of random candidate moves at each step (None means:
+##               all the moves, which requires `all_moves`)
+##   tenure:     for how many steps a move stays tabu
+##   key:        the function which gives the tabu attribute of a move
+##   patience:   stop if the best cost hasn't improved for this many steps
+##               (None means: never stop early)
+## The number of delta costs computed is `num_iters * candidates` at most, so
+## for a fair comparison with `greedy`, the latter should get that as its
+## `num_iters`.
+## If there are too few candidates, near a local minimum none of them is an
+## improvement and the search just wanders uphill: for TSP, a good choice is
+## about twice the number of cities (e.g. with 200 cities and 10**6 delta
+## costs, `candidates=400, num_iters=2500` does better than `greedy` with
+## `num_iters=10**6`).
+def tabu(probl, num_iters = 1000, candidates = 20, tenure = 10,
+         key = default_key, patience = None,
+         seed = None, verbose = 1):
+    if candidates is None:
+        if not hasattr(probl, "all_moves"):
+            raise Exception("the problem can't enumerate its moves, candidates must be given")
+    elif not isinstance(candidates, int) or candidates <= 0:
+        raise Exception("candidates must be a positive integer")
+    batched = hasattr(probl, "compute_delta_cost_batch") and \
+              (candidates is None or hasattr(probl, "propose_moves"))
+
+    ## Optionally set up the random number generator state
+    if seed is not None:
+        RB.seed(seed)
+
+    probl.init_config()
+    c = probl.cost()
+    if verbose >= 1:
+        print(f"initial cost = {c}")
+    best = BestTracker(probl, c)
+    tabus = TabuList(tenure)
+    last_improved = 0
+
+    for it in range(num_iters):
+        ## Generate and evaluate the candidates
+        if candidates is None:
+            moves = probl.all_moves()
+        elif batched:
+            moves = probl.propose_moves(candidates)
+        else:
+            moves = [probl.propose_move() for k in range(candidates)]
+        if batched:
+            deltas = np.asarray(probl.compute_delta_cost_batch(moves), dtype=float)
+            moves = moves.tolist()
+        else:
+            deltas = np.array([probl.compute_delta_cost(move) for move in moves], dtype=float)
+
+        ## Exclude the tabu moves, unless they lead to a new best
+        allowed = np.array([key(move) not in tabus for move in moves])
+        allowed |= c + deltas < best.c
+        if not allowed.any():
+            continue
+        deltas[~allowed] = np.inf
+        i = np.argmin(deltas)
+
+        move = moves[i]
+        probl.accept_move(move)
+        c += deltas[i]
+        tabus.add(key(move))
+        if c < best.c:
+            best.update(probl, c)
+            last_improved = it
+            if verbose >= 2:
+                print(f"  it={it} new best = {c}")
+        if patience is not None and it - last_improved >= patience:
+            break
+
+    if verbose >= 1:
+        print(f"final cost = {best.c}")
+    return best.get()
@@ -0,0 +1,47 @@
+import numpy as np
+
+### TELEMETRY ###
+
+## Printing the progress of a run with f-strings is fine for a few lines, but
+## it's slow when it happens in the inner loop, and the output is hard to
+## analyze afterwards. Instead, the solvers can record their statistics in
+## numpy "record arrays" (arrays with named fields, like a table), which are
+## returned together with the result. For example, after
+##     best, stats = SA.simann(probl, telemetry=True)
+## you can plot the acceptance rate vs beta with
+##     plt.plot(stats["stages"]["beta"], stats["stages"]["acc"])
+
+## The fields recorded by `simann` at the end of each MCMC run: beta,
+## acceptance rate, current cost, best cost, elapsed wall time (in seconds,
+## from the start of the run) and MCMC steps per second in that run.
+stage_dtype = np.dtype([("beta", float), ("acc", float), ("cost", float),
+                        ("best", float), ("time", float), ("mps", float)])
+
+## The fields recorded by `simann` every `sample_every` MCMC steps: total step
+## count, beta, acceptance rate so far in the current MCMC run, current cost,
+## best cost, elapsed wall time.
+sample_dtype = np.dtype([("step", int), ("beta", float), ("acc", float),
+                         ("cost", float), ("best", float), ("time", float)])
+
+## The fields recorded by `greedy` at the end of each run: final cost, step at
+## which the last move was accepted, elapsed wall time and steps per second in
+## that run.
+run_dtype = np.dtype([("cost", float), ("last_accepted", int),
+                      ("time", float), ("mps", float)])
+
+## A record array which is filled one row at a time. The memory is allocated
+## in advance (`size` rows); if more rows are needed, it's doubled.
+class Recorder:
+    def __init__(self, dtype, size=64):
+        self.data = np.zeros(max(size, 1), dtype=dtype)
+        self.len = 0
+
+    def add(self, *values):
+        if self.len == len(self.data):
+            self.data = np.concatenate((self.data, np.zeros_like(self.data)))
+        self.data[self.len] = values
+        self.len += 1
+
+    ## The rows filled so far
+    def result(self):
+        return self.data[:self.len]
@@ -0,0 +1,162 @@
+import numpy as np
+from copy import copy
+
+### A TWO-LEVEL TOUR ###
+
+## In `TSP`, the tour is an array (the route) and accepting a 2-opt move means
+## reversing a piece of it, which takes O(n) time. When n is large and many
+## moves get accepted, this becomes the bottleneck.
+##
+## Here the tour is split into about sqrt(n) "segments" of consecutive cities,
+## each segment has a "reversal bit" telling whether it must be read backwards,
+## and the segments are kept in a list in the order in which they are visited.
+## A 2-opt move reverses a path of the tour. To do that, we first split the
+## segments at the two ends of the path (so that the path is made of whole
+## segments), then we reverse the order of those segments in the list and flip
+## their reversal bits, without touching the cities inside them. Both steps take
+## O(sqrt(n)) time. Every split adds a segment, so from time to time (when
+## there are too many) the whole structure is rebuilt from scratch, which
+## takes O(n) time but happens only every O(sqrt(n)) moves.
+##
+## Since the tour is a cycle, reversing a path or reversing the rest of the
+## tour gives the same tour (only the direction changes): we always reverse the
+## shorter of the two.
+##
+## The cities are stored in an array `base`, in the order in which they were
+## when the structure was (re)built, and each segment is a range `lo:hi` of
+## that array. The segments are split by changing the ranges, and reversed by
+## flipping the bits, so the array itself never changes and the index of each
+## city in it (`idx`) is fixed; only the segment of each city (`seg_of`) needs
+## to be updated, with a single numpy call per split. The arrays with the data
+## of the segments are allocated for the maximum number of segments, so that a
+## split doesn't need to reallocate anything, and all the work on them is done
+## with slices.
+
+class TwoLevelTour:
+    ## Build the structure from a route (an array with a permutation of the cities)
+    def __init__(self, route):
+        self.n = len(route)
+        self.build(np.array(route, dtype=int))
+
+    ## (Re)build all the segments from an array of cities in tour order
+    def build(self, cities):
+        n = self.n
+        m = max(1, int(np.sqrt(n)))
+        ## When to rebuild (each move adds at most 2 segments)
+        self.max_segs = 2 * m + 2
+        size = self.max_segs + 2
+        self.base = cities
+        self.idx = np.zeros(n, dtype=int)  # index of each city in `base`
+        self.idx[cities] = np.arange(n)
+        bounds = np.linspace(0, n, m + 1).astype(int)
+        self.lo, self.hi = np.zeros(size, dtype=int), np.zeros(size, dtype=int)
+        self.lo[:m], self.hi[:m] = bounds[:-1], bounds[1:]
+        self.rev = np.zeros(size, dtype=bool)
+        self.order = np.zeros(size, dtype=int)  # the segments in tour order
+        self.rank = np.zeros(size, dtype=int)   # position of each segment in `order`
+        self.order[:m] = self.rank[:m] = np.arange(m)
+        self.m = m  # current number of segments
+        self.seg_of = np.repeat(np.arange(m), np.diff(bounds))[self.idx]  # segment of each city
+
+    def copy(self):
+        other = copy(self)
+        for attr in ("seg_of", "lo", "hi", "rev", "order", "rank"):
+            setattr(other, attr, getattr(self, attr).copy())
+        return other
+
+    ## The route, as an array (starting from the first segment)
+    def to_route(self):
+        base, lo, hi, rev = self.base, self.lo, self.hi, self.rev
+        return np.concatenate([base[lo[s]:hi[s]][::-1] if rev[s] else base[lo[s]:hi[s]]
+                               for s in self.order[:self.m]])
+
+    ## The first and the last city of segment `s` (in tour order)
+    def first(self, s):
+        return self.base[self.hi[s] - 1] if self.rev[s] else self.base[self.lo[s]]
+
+    def last(self, s):
+        return self.base[self.lo[s]] if self.rev[s] else self.base[self.hi[s] - 1]
+
+    ## The city after `c` in the tour
+    def next(self, c):
+        s, i = self.seg_of[c], self.idx[c]
+        if not self.rev[s]:
+            if i + 1 < self.hi[s]:
+                return self.base[i+1]
+        elif i > self.lo[s]:
+            return self.base[i-1]
+        return self.first(self.order[(self.rank[s] + 1) % self.m])
+
+    ## The city before `c` in the tour
+    def prev(self, c):
+        s, i = self.seg_of[c], self.idx[c]
+        if not self.rev[s]:
+            if i > self.lo[s]:
+                return self.base[i-1]
+        elif i + 1 < self.hi[s]:
+            return self.base[i+1]
+        return self.last(self.order[(self.rank[s] - 1) % self.m])
+
+    ## A key which gives the order of the cities along the tour (starting from
+    ## the first segment)
+    def position(self, c):
+        s, i = self.seg_of[c], self.idx[c]
+        return (self.rank[s], self.hi[s] - 1 - i if self.rev[s] else i - self.lo[s])
+
+    ## Whether `b` is on the path that goes from `a` forward to `c` (inclusive)
+    def between(self, a, b, c):
+        pa, pb, pc = self.position(a), self.position(b), self.position(c)
+        if pa <= pc:
+            return pa <= pb <= pc
+        return pb >= pa or pb <= pc
+
+    ## Split the segment of city `c` so that `c` becomes the first city (in
+    ## tour order) of its segment. The second part becomes a new segment, with
+    ## the same reversal bit.
+    def split_before(self, c):
+        s, i = self.seg_of[c], self.idx[c]
+        lo, hi, t = self.lo[s], self.hi[s], self.m
+        if not self.rev[s]:
+            if i == lo:
+                return
+            ## s becomes lo:i, the new segment is i:hi
+            self.hi[s], self.lo[t], self.hi[t] = i, i, hi
+        else:
+            if i == hi - 1:
+                return
+            ## s becomes i+1:hi, the new segment is lo:i+1
+            self.lo[s], self.lo[t], self.hi[t] = i + 1, lo, i + 1
+        self.rev[t] = self.rev[s]
+        self.seg_of[self.base[self.lo[t]:self.hi[t]]] = t
+        ## Insert t in the order, right after s
+        r = self.rank[s] + 1
+        order = self.order
+        order[r+1:t+1] = order[r:t]
+        order[r] = t
+        self.rank[order[r:t+1]] = np.arange(r, t+1)
+        self.m += 1
+
+    ## Reverse the path from city `a` forward to city `b` (inclusive)
+    def reverse(self, a, b):
+        ## Make the path correspond to whole segments
+        self.split_before(a)
+        self.split_before(self.next(b))
+        order, rank, rev, m = self.order, self.rank, self.rev, self.m
+        r1, r2 = rank[self.seg_of[a]], rank[self.seg_of[b]]
+        length = (r2 - r1) % m + 1
+        ## Reversing the complement gives the same tour: choose the shorter
+        if 2 * length > m:
+            r1 = (r2 + 1) % m
+            length = m - length
+        ks = (r1 + np.arange(length)) % m
+        segs = order[ks][::-1]
+        order[ks] = segs
+        rank[segs] = ks
+        rev[segs] = ~rev[segs]
+        if self.m > self.max_segs:
+            self.build(self.to_route())
+
+    ## The 2-opt move on cities `a` and `b`: the edges (a, next(a)) and
+    ## (b, next(b)) are replaced by (a, b) and (next(a), next(b)).
+    def two_opt(self, a, b):
+        self.reverse(self.next(a), b)
@@ -0,0 +1,40 @@
+import time
+import numpy as np
+
+import Sudoku
+import ExactCover
+
+## Solve Sudoku puzzles exactly with "ExactCover.py", and check whether their
+## solution is unique.
+
+def parse(rows):
+    return np.array([[int(c) - 1 if c != "." else -1 for c in row] for row in rows])
+
+## One of the hardest known puzzles (A. Inkala, 2012): the presolver of
+## "Presolve.py" can't fill in any entry, and the annealing rarely solves it
+hard = parse(["8........",
+              "..36.....",
+              ".7..9.2..",
+              ".5...7...",
+              "....457..",
+              "...1...3.",
+              "..1....68",
+              "..85...1.",
+              ".9....4.."])
+
+t = time.perf_counter()
+table = ExactCover.solve_table(hard)
+print(f"solved in {time.perf_counter() - t:.3f}s")
+print(table + 1)
+print("number of solutions:", ExactCover.count(hard))
+
+## Puzzles generated by removing entries at random from a solved table often
+## have many solutions: count them (up to 1000). The solved table is the one
+## above, with its values relabelled at random.
+np.random.seed(5417)
+sdk = Sudoku.Sudoku(9)
+for r in (0.5, 0.4, 0.3, 0.2):
+    sdk.restore(np.random.permutation(9)[table])
+    pzz = sdk.gen_puzzle(r)
+    num = ExactCover.count(pzz, limit=1000)
+    print(f"r={r}: {np.sum(pzz >= 0)} fixed entries, {num if num < 1000 else 'at least 1000'} solutions")
@@ -0,0 +1,42 @@
+import time
+import numpy as np
+
+import TSP
+import SimAnn as SA
+import HeldKarp
+from Greedy import greedy
+
+## Measure the exact optimality gaps of `greedy` and `simann` on many small
+## random instances, using the exact solution of "HeldKarp.py" as a reference.
+## For each solver we print the mean and the maximum gap (in percent) and the
+## fraction of the instances in which it found the optimum.
+
+n = 10
+num_instances = 1000
+
+np.random.seed(8273648)
+seeds = np.random.randint(2**32, size=num_instances, dtype=np.uint64)
+gaps = {"greedy": np.zeros(num_instances), "simann": np.zeros(num_instances)}
+times = {"exact": 0.0, "greedy": 0.0, "simann": 0.0}
+for k in range(num_instances):
+    tsp = TSP.TSP(n, seed=int(seeds[k]))
+
+    t = time.perf_counter()
+    opt, route = HeldKarp.held_karp(tsp.dist)
+    times["exact"] += time.perf_counter() - t
+
+    t = time.perf_counter()
+    best = greedy(tsp, repeats=1, num_iters=1000, verbose=0)
+    times["greedy"] += time.perf_counter() - t
+    gaps["greedy"][k] = (best.cost() - opt) / opt
+
+    t = time.perf_counter()
+    best = SA.simann(tsp, mcmc_steps=100, beta_list=SA.linearbeta(1.0, 30.0, 10), verbose=0)
+    times["simann"] += time.perf_counter() - t
+    gaps["simann"][k] = (best.cost() - opt) / opt
+
+print(f"{num_instances} instances with {n} cities")
+print(f"exact: {times['exact']:.2f}s")
+for solver, gap in gaps.items():
+    print(f"{solver}: mean gap = {100 * gap.mean():.2f}%, max gap = {100 * gap.max():.2f}%, "
+          f"optimal in {100 * np.mean(gap < 1e-9):.1f}% of the instances, {times[solver]:.2f}s")
@@ -0,0 +1,22 @@
+import numpy as np
+
+import TSP
+
+## Check `TSP.polish` with all the ways of storing the distances: with all the
+## other cities as neighbours (`k = n-1`), the polished tour must be a local
+## minimum, i.e. no 2-opt move can improve it. The deltas of all the moves are
+## computed at once with `compute_delta_cost_batch`, with a small tolerance for
+## the rounding errors of single precision.
+
+n = 300
+
+for distances in ("float64", "float32", "implicit"):
+    tsp = TSP.TSP(n, seed=2741, distances=distances)
+    c0 = tsp.cost()
+    gain = tsp.polish(k=n-1)
+    deltas = tsp.compute_delta_cost_batch(tsp.all_moves())
+    improving = np.sum(deltas < -1e-5)
+    print(f"{distances}: cost {c0:.4f} -> {tsp.cost():.4f} (gain {gain:.4f}), "
+          f"{improving} improving moves left")
+    if improving > 0:
+        raise Exception(f"polish with {distances} distances stopped before a local minimum")
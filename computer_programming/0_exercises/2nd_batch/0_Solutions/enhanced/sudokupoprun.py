@@ -0,0 +1,18 @@
+import Sudoku
+import PopAnn as PA
+import SimAnn as SA
+
+## A hook for early exit in case a solution is found (same idea as in
+## "sudokurun.py", but with the signature used by `popann`)
+def checksolved(sdk, costs):
+    return sdk.cost() != 0
+
+## The guard is needed because `popann` uses a process pool (see "sudokuptrun.py")
+if __name__ == "__main__":
+    sdk = Sudoku.Sudoku(9)
+
+    best = PA.popann(sdk, population=200, mcmc_steps=200, seed=58473625,
+                     beta_list=SA.linearbeta(beta0=0.5, beta1=6.0, steps=31)[:-1],
+                     hook=checksolved)
+
+    print("final best configuration:\n", best, "\ncost=", best.cost())
@@ -0,0 +1,50 @@
+import numpy as np
+
+import Sudoku
+import SimAnn as SA
+
+## Presolve a few puzzles (see "Presolve.py") and anneal only what is left.
+## The puzzles are written as in the newspapers, with "." for the empty
+## entries and the values from 1 to 9 (the `Sudoku` class uses 0...8).
+
+def checksolved(sdk, best, beta, cost, accrate):
+    return cost != 0
+
+def parse(rows):
+    return np.array([[int(c) - 1 if c != "." else -1 for c in row] for row in rows])
+
+puzzles = {
+    "easy": ["53..7....",
+             "6..195...",
+             ".98....6.",
+             "8...6...3",
+             "4..8.3..1",
+             "7...2...6",
+             ".6....28.",
+             "...419..5",
+             "....8..79"],
+    "medium": ["8.2.....9",
+               ".4368..7.",
+               "...4.128.",
+               "....3789.",
+               "...8...2.",
+               "..7.6....",
+               "5.1..436.",
+               "..8.26...",
+               ".96318..."],
+}
+
+for name, rows in puzzles.items():
+    pzz = parse(rows)
+    sdk = Sudoku.Sudoku(pzz, presolve=True)
+    print(f"{name}: {np.sum(pzz < 0)} free entries, {np.sum(~sdk.mask)} after presolving")
+    if sdk.cost() == 0:
+        print(sdk)
+        continue
+    sdk.showpuzzle()
+    best = SA.simann(sdk, mcmc_steps=10**4, seed=783636464,
+                     beta_list=SA.linearbeta(beta0=0.1, beta1=3.0, steps=30),
+                     accept_hook=checksolved, mc_hook=checksolved)
+    print("final best configuration:\n", best, "\ncost=", best.cost())
+    if best.cost() == 0:
+        print("~SOLVED!~")
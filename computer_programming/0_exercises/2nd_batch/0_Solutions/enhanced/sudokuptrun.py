@@ -0,0 +1,32 @@
+import Sudoku
+import ParTemp as PT
+
+## A hook for early exit in case a solution is found (same idea as in
+## "sudokurun.py", but with the signature used by `partemp`)
+def checksolved(replicas, best, costs):
+    return best.cost() != 0
+
+## The guard is needed because `partemp` uses a process pool: on some systems
+## the worker processes re-import this file, and they must not re-run it.
+if __name__ == "__main__":
+    sdk = Sudoku.Sudoku(9)
+
+    best = PT.partemp(sdk, swaps=1000, mcmc_steps=10**3, seed=58473625,
+                      beta_list=PT.geombeta(beta0=0.5, beta1=10.0, steps=8),
+                      hook=checksolved)
+
+    print("final best configuration:\n", best, "\ncost=", best.cost())
+
+    pzz = best.gen_puzzle(0.3)
+    sdkpzz = Sudoku.Sudoku(pzz)
+
+    sdkpzz.showpuzzle()
+
+    bestpzz = PT.partemp(sdkpzz, swaps=1000, mcmc_steps=10**3, seed=783636464,
+                         beta_list=PT.geombeta(beta0=0.1, beta1=5.0, steps=8),
+                         hook=checksolved)
+
+    print("final best configuration:\n", bestpzz, "\ncost=", bestpzz.cost())
+
+    if bestpzz.cost() == 0:
+        print("~SOLVED!~")
@@ -0,0 +1,44 @@
+import os
+import glob
+
+import TSPLIB
+import SimAnn as SA
+from Greedy import greedy
+
+## A benchmark of `greedy` and `simann` on the TSPLIB instances of the "tsplib"
+## directory (see "TSPLIB.py"): for each instance and solver, it prints the
+## cost found, the gap from the optimal cost (in percent), the time and the
+## number of MCMC steps (proposed moves) per second. The optimal costs are
+## computed from the ".opt.tour" files.
+## Other instances (e.g. downloaded from TSPLIB) can be added to the directory,
+## together with their optimal tours; for large ones, use more steps.
+
+directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tsplib")
+
+print(f"{'instance':>10} {'n':>4} {'opt':>8} | {'solver':>6} {'cost':>8} {'gap%':>6} "
+      f"{'time':>6} {'moves/s':>9}")
+for filename in sorted(glob.glob(os.path.join(directory, "*.tsp"))):
+    name = os.path.basename(filename)[:-len(".tsp")]
+    probl = TSPLIB.load(filename)
+    opt = TSPLIB.tour_cost(probl, TSPLIB.read_tour(filename[:-len(".tsp")] + ".opt.tour"))
+
+    ## Greedy: a few runs from random tours, keeping the best
+    repeats, num_iters = 10, 2000
+    best, stats = greedy(probl, repeats=repeats, num_iters=num_iters, seed=123,
+                         verbose=0, telemetry=True)
+    runtime = stats["runs"]["time"][-1]
+    results = [("greedy", best.cost(), runtime, repeats * num_iters / runtime)]
+
+    ## Simulated annealing, with the adaptive protocol (the scale of the costs
+    ## is very different among the instances)
+    mcmc_steps = 2000
+    best, stats = SA.simann(probl, mcmc_steps=mcmc_steps, seed=456,
+                            beta_list=SA.AdaptiveBeta(probl, acc0=0.5),
+                            verbose=0, telemetry=True)
+    runtime = stats["stages"]["time"][-1]
+    results.append(("simann", best.cost(), runtime,
+                    len(stats["stages"]) * mcmc_steps / runtime))
+
+    for solver, c, runtime, mps in results:
+        print(f"{name:>10} {probl.n:>4} {opt:>8.0f} | {solver:>6} {c:>8.0f} "
+              f"{100 * (c - opt) / opt:>6.2f} {runtime:>6.2f} {mps:>9.0f}")
@@ -0,0 +1,17 @@
+import TSP
+import SimAnn as SA
+from LiveView import LiveView
+
+## Same as "tsprun.py", but on a larger instance, watching the route while
+## `simann` runs (see "LiveView.py"). The plotting happens in another process,
+## at most 10 times per second, so it doesn't slow down the annealing.
+## Without a display, pass e.g. `filename="tsplive.png"` to `LiveView` and look
+## at that image instead.
+
+if __name__ == "__main__":
+    tsp = TSP.TSP(1000, seed=456329, neighbours=8)
+    view = LiveView(tsp, fps=10)
+    best = SA.simann(tsp, mcmc_steps=10**5, seed=238723784,
+                     beta_list=SA.AdaptiveBeta(tsp, acc0=0.5),
+                     accept_hook=view.hook)
+    view.close(best, title=f"final cost = {best.cost():.6g}")
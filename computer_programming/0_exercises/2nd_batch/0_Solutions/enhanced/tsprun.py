@@ -0,0 +1,14 @@
+import TSP
+import SimAnn as SA
+
+## Same as "../tsprun.py", but with an adaptive annealing protocol: no need to
+## choose beta0, beta1 and the number of annealing steps.
+
+## Generate a problem to solve.
+tsp = TSP.TSP(100, seed=456329)
+
+## Optimize it.
+best = SA.simann(tsp, mcmc_steps = 5000, seed = 238723784,
+                 beta_list = SA.AdaptiveBeta(tsp, acc0=0.5))
+
+best.display()
@@ -1,30 +1,96 @@
 import numpy as np
 
 
-def greedy(probl, repeats=1, num_iters=100, seed=None):
+def find_move(probl, mode):
+    """Scans the moves of the neighbourhood, returns an improving one and its
+    delta cost, or None if we are at a local optimum
+
+    * mode: "steepest" returns the best move. "first" looks at the moves
+        block by block (starting from a random block) and returns the first
+        improving one that it finds, so it usually doesn't look at all of them
+
+    The problem needs the methods all_moves() and compute_delta_cost_batch(moves)
+    """
+    moves = probl.all_moves()
+
+    if mode == "steepest":
+        # all the delta costs at once, without a python loop
+        deltas = probl.compute_delta_cost_batch(moves)
+        i = np.argmin(deltas)
+        if deltas[i] < 0:
+            return moves[i], deltas[i]
+        return None
+
+    # blocks of about n moves (the cost of each numpy call should be
+    #   larger than its overhead)
+    n_blocks = max(1, len(moves) // probl.n)
+    start = np.random.randint(n_blocks)
+    blocks = np.array_split(moves, n_blocks)
+    for b in range(n_blocks):
+        block = blocks[(start + b) % n_blocks]
+        deltas = probl.compute_delta_cost_batch(block)
+        improving = np.flatnonzero(deltas < 0)
+        if len(improving) > 0:
+            i = improving[0]
+            return block[i], deltas[i]
+    return None
+
+
+def greedy(probl, repeats=1, num_iters=100, seed=None, verbose=1, mode="random"):
     """Greedy algorithm
     * probl: the problem to solve
     * repeates: how many times you repeat the algorithm
     * num_iters: how many iterations per run
     * seed: for consistent results
+    * verbose: 0 prints nothing, 1 prints the costs of each run, 2 also prints
+        every accepted move (slow!)
+    * mode: "random" proposes one random move per iteration and accepts it if
+        it doesn't increase the cost. "steepest" and "first" look at the whole
+        neighbourhood at each iteration and apply the best (or the first)
+        improving move, see find_move. They stop as soon as there are no
+        improving moves, i.e. exactly at a local optimum, so num_iters is just
+        an upper bound for them
     """
 
+    if mode not in ("random", "steepest", "first"):
+        raise Exception("mode must be one of 'random', 'steepest' or 'first'")
+    if mode != "random" and not hasattr(probl, "all_moves"):
+        raise Exception("the problem can't enumerate its moves, use mode='random'")
+
     best_config = None
-    best_cost = np.infty
+    best_cost = np.inf
 
-    for _ in range(repeats):
-        if seed is not None:
-            np.random.seed(seed)
+    # seed once, before the repeats: seeding inside the loop would make all the
+    #   repeats identical. To run the repeats in parallel, see MultiStart.py
+    #   in the "enhanced" solutions, which gives each run its own random stream
+    if seed is not None:
+        np.random.seed(seed)
 
+    for _ in range(repeats):
         # store the configuration inside the object and not in the greedy function
         probl.init_config()
         cx = probl.cost()
 
         # probl.display()
 
-        print(f"initial cost is {cx:.5f}, starting route is {probl.route}")
+        if verbose >= 1:
+            print(f"initial cost is {cx:.5f}, starting route is {probl.route}")
 
         for t in range(num_iters):
+            if mode != "random":
+                found = find_move(probl, mode)
+                if found is None:
+                    # local optimum reached, nothing else to do
+                    if verbose >= 1:
+                        print(f"local optimum reached at t = {t}")
+                    break
+                move, delta_c = found
+                probl.accept_move(move)
+                cx += delta_c
+                if verbose >= 2:
+                    print(f"\tmove accepted, c = {cx}, t = {t}")
+                continue
+
             # we make propose move a method of the problem so that you can specify it in the problem object
             # y = probl.propose_move(x)
             move = probl.propose_move()
@@ -38,11 +104,14 @@ def greedy(probl, repeats=1, num_iters=100, seed=None):
                 # cx = cy
                 cx += delta_c
 
-                # print the new cost
-                print(f"\tmove accepted, c = {cx}, t = {t}")
+                # print the new cost (printing at every move is expensive,
+                #   so we only do it if asked)
+                if verbose >= 2:
+                    print(f"\tmove accepted, c = {cx}, t = {t}")
 
         # stopping criteria -> max number of iterations reached
-        print(f"final cost: {cx}")
+        if verbose >= 1:
+            print(f"final cost: {cx}")
 
         if cx < best_cost:
             best_cost = cx
@@ -55,9 +124,10 @@ def greedy(probl, repeats=1, num_iters=100, seed=None):
 
             # hence there are different types of copy, shallow (depth = 1, leads to the problem described above)
             #   we are going to use deep copy which solves the problem we've described
-            best_probl = probl.copy()  # use the method defined in the object
+            best_config = probl.copy()  # use the method defined in the object
 
-    best_probl.display()
-    print(f"Best cost: {best_cost}")
+    if verbose >= 1:
+        best_config.display()
+        print(f"Best cost: {best_cost}")
 
     return best_cost, best_config
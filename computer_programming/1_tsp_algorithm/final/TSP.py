@@ -95,16 +95,21 @@ class TSP:
     def cost(self):
         """Calculates all the distances and sums them to get to the final cost"""
 
-        dist = 0.0
         route = self.route
 
-        for i in range(self.n):
-            city1 = route[i]
-            city2 = route[(i + 1) % self.n]
+        # np.roll(route, -1) is the route shifted by one (the first city goes
+        # to the end), so the i-th edge goes from route[i] to np.roll(route, -1)[i]:
+        # we can take all the distances from the matrix at once
+        return self.distance[route, np.roll(route, -1)].sum()
 
-            dist += self.distance[city1, city2]
+    def costs(self, routes):
+        """Calculates the costs of many routes at once
 
-        return dist
+        * routes: 2-d array, one route per row
+        """
+
+        routes = np.asarray(routes)
+        return self.distance[routes, np.roll(routes, -1, axis=1)].sum(axis=1)
 
     # we split the propose_move in two functions
     def propose_move(self):
@@ -182,6 +187,37 @@ class TSP:
 
         return delta_c
 
+    def all_moves(self):
+        """Returns all the valid moves, as an array with one (e1, e2) pair per row.
+
+        They never change, so we compute them once and store them in the object
+        """
+        if getattr(self, "_all_moves", None) is None:
+            n = self.n
+            # all the pairs with e2 >= e1 + 2 (the upper triangle of an n x n
+            #   table, without the diagonal and the one above it)
+            e1, e2 = np.triu_indices(n, 2)
+            # except (0, n-1), which just inverts the route
+            valid = ~((e1 == 0) & (e2 == n - 1))
+            self._all_moves = np.stack((e1[valid], e2[valid]), axis=1)
+        return self._all_moves
+
+    def compute_delta_cost_batch(self, moves):
+        """Same as compute_delta_cost, but for an array of moves (one per row).
+
+        Instead of a loop over the moves, we use the fancy indexing: each
+        variable is an array with one entry per move
+        """
+        route, distance = self.route, self.distance
+        e1, e2 = moves[:, 0], moves[:, 1]
+        city11, city12 = route[e1], route[e1 + 1]
+        city21, city22 = route[e2], route[(e2 + 1) % self.n]
+
+        old_c = distance[city11, city12] + distance[city21, city22]
+        new_c = distance[city11, city21] + distance[city12, city22]
+
+        return new_c - old_c
+
     def copy(self):
         # we could optimize it more, i.e. the coordinates of the cities will not change so
         #   we just need to copy the reference to the route
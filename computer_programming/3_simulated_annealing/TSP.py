@@ -6,10 +6,13 @@ import matplotlib.pyplot as plt
 class TSP:
     """Class that handles the Travelling Sales Man Problem"""
 
-    def __init__(self, n, seed=None):
+    def __init__(self, n, seed=None, move_weights=(1.0, 0.0, 0.0)):
         """Inits the TSP Problem
 
         * n: number of cities in the problem
+        * move_weights: how often each kind of move is proposed (2-opt, Or-opt
+            and 3-opt, in this order; they are normalized). By default only
+            2-opt moves, see propose_move
         """
 
         # check if n is an int greater than 4
@@ -22,6 +25,12 @@ class TSP:
         # store n for later use
         self.n = n
 
+        move_weights = np.array(move_weights, dtype=float)
+        if move_weights.shape != (3,) or (move_weights < 0).any() or move_weights.sum() == 0:
+            raise Exception("move_weights needs to be 3 non-negative numbers, not all zero")
+        # cumulative probabilities, to choose the kind of move with one random number
+        self.move_cumprob = np.cumsum(move_weights) / move_weights.sum()
+
         # create the coordinates of the cities
         x = np.random.rand(n)
         y = np.random.rand(n)
@@ -75,18 +84,43 @@ class TSP:
     def cost(self):
         """Calculates all the distances and sums them to get to the final cost"""
 
-        dist = 0.0
         route = self.route
 
-        for i in range(self.n):
-            city1 = route[i]
-            city2 = route[(i + 1) % self.n]
+        # np.roll(route, -1) is the route shifted by one (the first city goes
+        # to the end), so the i-th edge goes from route[i] to np.roll(route, -1)[i]:
+        # we can take all the distances from the matrix at once
+        return self.distance[route, np.roll(route, -1)].sum()
+
+    def costs(self, routes):
+        """Calculates the costs of many routes at once
 
-            dist += self.distance[city1, city2]
+        * routes: 2-d array, one route per row
+        """
 
-        return dist
+        routes = np.asarray(routes)
+        return self.distance[routes, np.roll(routes, -1, axis=1)].sum(axis=1)
 
     def propose_move(self):
+        """Proposes a random move, of a kind chosen according to move_weights
+
+        * 2-opt: (e1, e2), the route between the edges e1 and e2 gets reversed
+        * Or-opt: ("oropt", i, L, j, rev), the piece of L cities (1 to 3) that
+            starts at position i gets moved between the positions j and j + 1,
+            and reversed if rev is True
+        * 3-opt: ("3opt", i, j, k) with i < j < k, the pieces i+1..j and
+            j+1..k get exchanged (without reversing them)
+
+        The last two help to get out of the local minima of 2-opt. All the
+        proposals are symmetric
+        """
+        u = np.random.rand()
+        if u < self.move_cumprob[0]:
+            return self.propose_2opt()
+        elif u < self.move_cumprob[1]:
+            return self.propose_oropt()
+        return self.propose_3opt()
+
+    def propose_2opt(self):
         n = self.n
 
         # select the two edges randomly
@@ -103,15 +137,62 @@ class TSP:
         move = (e1, e2)
         return move
 
+    def propose_oropt(self):
+        n = self.n
+
+        # the piece must not wrap around the end of the route, and with too few
+        #   cities there would be no place where to put it
+        length = np.random.randint(min(3, n - 3)) + 1
+        i = np.random.randint(n - length + 1)
+
+        # j must not be inside the piece or just before it (nothing would change)
+        while True:
+            j = np.random.randint(n)
+            if j != (i - 1) % n and not (i <= j < i + length):
+                break
+
+        rev = np.random.rand() < 0.5
+        return ("oropt", i, length, j, rev)
+
+    def propose_3opt(self):
+        # three different positions, in increasing order
+        i, j, k = np.sort(np.random.choice(self.n, 3, replace=False))
+        return ("3opt", i, j, k)
+
     def accept_move(self, move):
-        """Accepts the move, reversing the order of the vertices between the
-        ones specified in move
+        """Accepts the move, changing the route in place. There are three kinds
+        of moves (see propose_move):
 
         Args:
-            move (tuple): (e1, e2)
+            move (tuple): one of
+                (e1, e2): 2-opt, reverses the vertices between positions e1+1
+                    and e2 (included)
+                ("oropt", i, length, j, rev): moves the piece of `length`
+                    vertices starting at position i after the vertex at
+                    position j, reversing it if `rev` is True
+                ("3opt", i, j, k): swaps the segments i+1...j and j+1...k,
+                    without reversing them
         """
-        e1, e2 = move
         route = self.route
+
+        if move[0] == "oropt":
+            _, i, length, j, rev = move
+            piece = route[i : i + length]
+            if rev:
+                piece = piece[::-1]
+            # remove the piece, then put it back after the city that was at
+            #   position j (which is now at j - length if it was after the piece)
+            rest = np.concatenate((route[:i], route[i + length :]))
+            ja = j if j < i else j - length
+            route[:] = np.concatenate((rest[: ja + 1], piece, rest[ja + 1 :]))
+            return
+
+        if move[0] == "3opt":
+            _, i, j, k = move
+            route[i + 1 : k + 1] = np.concatenate((route[j + 1 : k + 1], route[i + 1 : j + 1]))
+            return
+
+        e1, e2 = move
         route[e1 + 1 : e2 + 1] = route[e2:e1:-1]  # reason about the indices choice
 
     def compute_delta_cost(self, move):
@@ -122,7 +203,33 @@ class TSP:
         new cost = cost of all edges + cost(E1) + cost(E2) where E1, E2 are the new edges with the vertices switched
         """
 
-        route = self.route
+        route, distance, n = self.route, self.distance, self.n
+
+        if move[0] == "oropt":
+            # the piece goes from first to last and is between prev and nxt,
+            #   it will go between a and b: only 3 links change
+            _, i, length, j, rev = move
+            prev, first = route[(i - 1) % n], route[i]
+            last, nxt = route[i + length - 1], route[(i + length) % n]
+            a, b = route[j], route[(j + 1) % n]
+
+            old_c = distance[prev, first] + distance[last, nxt] + distance[a, b]
+            if rev:
+                first, last = last, first
+            new_c = distance[prev, nxt] + distance[a, first] + distance[last, b]
+            return new_c - old_c
+
+        if move[0] == "3opt":
+            # the links (i, i+1), (j, j+1), (k, k+1) become (i, j+1), (k, i+1), (j, k+1)
+            _, i, j, k = move
+            ci, ci1 = route[i], route[i + 1]
+            cj, cj1 = route[j], route[j + 1]
+            ck, ck1 = route[k], route[(k + 1) % n]
+
+            old_c = distance[ci, ci1] + distance[cj, cj1] + distance[ck, ck1]
+            new_c = distance[ci, cj1] + distance[ck, ci1] + distance[cj, ck1]
+            return new_c - old_c
+
         e1, e2 = move
         city11, city12 = route[e1], route[e1 + 1]  # cause e1 < e2
         city21, city22 = route[e2], route[(e2 + 1) % self.n]